@@ -1,13 +1,15 @@
 import abc
 import json
 import os
+import re
 from pathlib import Path
-from threading import Thread
+from threading import Thread, Lock
 from time import sleep
-from typing import Dict, Optional, Match, Union, Tuple
+from typing import Dict, Optional, Match, Union, Tuple, Callable, Iterable, Sequence, List
 
 from src import log
-from src.utils import KeyParagraphMapping
+from src.fuzzy import FuzzyIndex
+from src.utils import KeyParagraphMapping, TokenTrie
 
 
 class ActionRegistry:
@@ -23,9 +25,29 @@ class ActionRegistry:
             except Exception as e:
                 ActionRegistry._logger.warning(f"Could not load action from %s: {e}")
 
-    def __init__(self, actions_path: str):
+    def __init__(self,
+                 actions_path: str,
+                 fuzzy_max_distance_ratio: Optional[float] = None,
+                 fuzzy_min_margin: float = 0.,
+                 handler_names: Sequence[str] = ()):
+        """
+        :param fuzzy_max_distance_ratio: Maximum edit distance relative to the length of the matched instruction part
+        for finding actions by similar literal keys. If None, fuzzy matching is disabled.
+        :param fuzzy_min_margin: Minimum difference of relative distances by which the best fuzzy match has to be
+        closer than the best fuzzy match of any other action.
+        :param handler_names: Names of the available action handlers. Actions not naming a handler are routed to the
+        first one.
+        """
         self.actions_path = actions_path
         self.actions: Dict[str, Tuple[int, KeyParagraphMapping]] = {}    # filename -> (modified time, action)
+        self.fuzzy_max_distance_ratio = fuzzy_max_distance_ratio
+        self.fuzzy_min_margin = fuzzy_min_margin
+        self._fuzzy_index: Optional[FuzzyIndex[KeyParagraphMapping]] = None
+        self._key_tries: Dict[Callable[[str], Iterable[Sequence[int]]], TokenTrie] = {}    # tokenizer -> trie
+        self._key_tries_lock = Lock()
+        self.reload_interval_s: float = 5
+        self.handler_names = list(handler_names)
+        self._routes: Dict[KeyParagraphMapping, str] = {}    # action -> handler name
 
     def find(self, instruction: str) -> Optional[Tuple[KeyParagraphMapping, Match[str]]]:
         for _, action in self.actions.values():
@@ -35,11 +57,107 @@ class ActionRegistry:
                 return action, match
         return None
 
+    def find_fuzzy(self, instruction: str) -> Optional[Tuple[KeyParagraphMapping, Match[str]]]:
+        """
+        Finds the action with the literal key most similar to some part of the instruction. Intended as a fallback if
+        find does not yield an action.
+        :return: The action and the match of its pattern against the similar key.
+        """
+        fuzzy_index = self._fuzzy_index
+        if fuzzy_index is None:
+            return None
+        finding = fuzzy_index.find(instruction.lower())
+        if finding is None:
+            return None
+        key, action, relative_distance = finding
+        match = action.matches(key) or re.match(re.escape(key), key)
+        self._logger.info(f"Found fuzzy matching action for instruction: instruction={instruction}, key={key}, relative_distance={round(relative_distance, 3)}")
+        return action, match
+
+    def route(self, action: KeyParagraphMapping) -> Optional[str]:
+        """
+        :return: The name of the handler to pass the given action to or None if the handler named by the action is not
+        available.
+        """
+        return self._routes.get(action, None)
+
+    def _rebuild_routes(self) -> None:
+        if len(self.handler_names) < 1:
+            # actions are not handled, e.g. when only listing keys
+            return
+        default_handler_name = self.handler_names[0]
+        routes = {}
+        for file_name, (_, action) in self.actions.items():
+            if action is None:
+                continue
+            handler_name = action.handler or default_handler_name
+            if handler_name not in self.handler_names:
+                self._logger.warning(f"Action {file_name} names unknown handler {handler_name}: available_handlers={self.handler_names}")
+                continue
+            routes[action] = handler_name
+        self._routes = routes
+
+    def literal_keys(self) -> List[str]:
+        """
+        :return: All keys of all loaded actions that are not regex patterns.
+        """
+        return [key.lower() for _, action in self.actions.values() if action is not None for key in action.literal_keys]
+
+    def key_trie(self, tokenize: Callable[[str], Iterable[Sequence[int]]]) -> TokenTrie:
+        """
+        :param tokenize: Maps a key to its token sequences.
+        :return: A trie over the token sequences of all literal keys. The trie is built once per tokenizer and rebuilt
+        whenever actions are reloaded.
+        """
+        with self._key_tries_lock:
+            trie = self._key_tries.get(tokenize, None)
+            if trie is None:
+                trie = self._build_key_trie(tokenize)
+                self._key_tries[tokenize] = trie
+            return trie
+
+    def _build_key_trie(self, tokenize: Callable[[str], Iterable[Sequence[int]]]) -> TokenTrie:
+        return TokenTrie(sequence for key in self.literal_keys() for sequence in tokenize(key))
+
+    def discard_key_tries(self, tokenizers: Iterable[Callable[[str], Iterable[Sequence[int]]]]) -> None:
+        """
+        Drops the tries built for the given tokenizers, e.g. once no transcriber uses them anymore.
+        """
+        with self._key_tries_lock:
+            for tokenize in tokenizers:
+                self._key_tries.pop(tokenize, None)
+
+    def _rebuild_key_tries(self) -> None:
+        with self._key_tries_lock:
+            self._key_tries = {tokenize: self._build_key_trie(tokenize) for tokenize in self._key_tries.keys()}
+
+    def configure_fuzzy_matching(self, fuzzy_max_distance_ratio: Optional[float], fuzzy_min_margin: float) -> None:
+        """
+        Rebuilds the fuzzy index with the given parameters, see __init__.
+        """
+        self.fuzzy_max_distance_ratio = fuzzy_max_distance_ratio
+        self.fuzzy_min_margin = fuzzy_min_margin
+        self._rebuild_fuzzy_index()
+
+    def _rebuild_fuzzy_index(self) -> None:
+        if self.fuzzy_max_distance_ratio is None:
+            self._fuzzy_index = None
+            return
+        self._fuzzy_index = FuzzyIndex(
+            ((key.lower(), action) for _, action in self.actions.values() if action is not None for key in action.literal_keys),
+            max_distance_ratio=self.fuzzy_max_distance_ratio,
+            min_margin=self.fuzzy_min_margin
+        )
+
     def start_periodic_reloading_in_background(self, interval_duration_s) -> None:
+        """
+        :param interval_duration_s: The initial interval, which may be changed later on by setting reload_interval_s.
+        """
         self._logger.info(f"Starting periodic reloading of new or updated actions: location={self.actions_path}, interval_duration_s={interval_duration_s}")
+        self.reload_interval_s = interval_duration_s
         def reloader() -> None:
             while True:
-                sleep(interval_duration_s)
+                sleep(self.reload_interval_s)
                 self._reload_actions()
         Thread(target=reloader, name="lurker_action_reloader", daemon=True).start()
 
@@ -53,6 +171,9 @@ class ActionRegistry:
             abs_path: Path = Path(self.actions_path).joinpath(action_path.path)
             loaded_action = ActionRegistry._load_action(abs_path)
             self.actions[action_path.name] = (int(abs_path.stat().st_mtime), loaded_action)
+        self._rebuild_routes()
+        self._rebuild_key_tries()
+        self._rebuild_fuzzy_index()
         self._logger.info(f"Loaded actions: count={len(self.actions)}, files={list(self.actions.keys())}")
 
     def _reload_actions(self) -> None:
@@ -61,6 +182,7 @@ class ActionRegistry:
             self._logger.warning(f"Could not find action path {self.actions_path}")
             return
         try:
+            reloaded = False
             for action_path in os.scandir(self.actions_path):
                 if not action_path.is_file():
                     continue
@@ -70,22 +192,32 @@ class ActionRegistry:
                     # file is unknown or touched: reload
                     self.actions[abs_path.name] = (mtime, ActionRegistry._load_action(abs_path))
                     self._logger.info(f"Reloaded action {abs_path.name}")
+                    reloaded = True
+            if reloaded:
+                self._rebuild_routes()
+                self._rebuild_key_tries()
+                self._rebuild_fuzzy_index()
         except Exception as e:
             self._logger.error(f"Could not reload action: {e}", exc_info=e)
 
 
 class LoadedHandlerType:
-    cls: Optional[type] = None
+    classes: List[type] = []
 
     @staticmethod
-    def get_implementation() -> type:
-        return NOPHandler if LoadedHandlerType.cls is None else LoadedHandlerType.cls
+    def get_implementations() -> List[type]:
+        """
+        :return: The registered implementations in the order of registration or NOPHandler if none has been registered.
+        The first one is the default handler.
+        """
+        return [NOPHandler] if len(LoadedHandlerType.classes) == 0 else list(LoadedHandlerType.classes)
 
 
 class ActionHandler(abc.ABC):
     """
     Baseclass to act on a specific instruction.
-    This class is intended to be extended.
+    This class is intended to be extended. Several subclasses may be registered, each of which is referred to by its
+    class name in the "handler" property of actions.
     """
 
     _logger = log.new_logger(__qualname__)
@@ -97,11 +229,11 @@ class ActionHandler(abc.ABC):
         if cls.__module__ == ActionHandler.__module__:
             # ignore implementations from this module
             return
-        if LoadedHandlerType.cls is None:
-            LoadedHandlerType.cls = cls
-            ActionHandler._logger.debug(f"Registered action handler {cls}")
-        else:
-            raise RuntimeError(f"Only one subclass may be registered and {LoadedHandlerType.cls} has already been registered.")
+        for registered_cls in LoadedHandlerType.classes:
+            if registered_cls.__name__ == cls.__name__:
+                raise RuntimeError(f"Handler names must be unique and {registered_cls} has already been registered.")
+        LoadedHandlerType.classes.append(cls)
+        ActionHandler._logger.debug(f"Registered action handler {cls}")
 
     @abc.abstractmethod
     def handle(self, action: KeyParagraphMapping, key_match: Match[str]) -> int:
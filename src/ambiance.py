@@ -0,0 +1,46 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+
+class AmbianceTracker:
+    """
+    Incremental estimate of the ambient noise floor of an audio stream.
+
+    The floor follows the mean absolute amplitude of incoming audio blocks by asymmetric exponential smoothing:
+    It falls quickly towards quieter blocks and rises slowly towards louder ones. Short bursts of speech hardly move
+    the floor while a lasting change of the surrounding noise level is adopted within a few seconds.
+    Apart from computing the mean of a block, each update takes constant time.
+    """
+
+    def __init__(self, sample_rate: int, rise_time_seconds: float, fall_time_seconds: float):
+        if rise_time_seconds <= 0 or fall_time_seconds <= 0:
+            raise ValueError(f"Time constants must be positive: rise_time_seconds={rise_time_seconds}, fall_time_seconds={fall_time_seconds}")
+        self.sample_rate = sample_rate
+        self.rise_time_seconds = rise_time_seconds
+        self.fall_time_seconds = fall_time_seconds
+        self._floor: Optional[float] = None
+
+    @property
+    def floor(self) -> float:
+        """The current noise floor as mean absolute amplitude. Zero if no audio has been observed yet."""
+        return 0. if self._floor is None else self._floor
+
+    def update(self, block: np.ndarray) -> None:
+        """
+        :param block: The most recently captured audio samples.
+        """
+        frames = len(block)
+        if frames < 1:
+            return
+        level = float(np.abs(block).mean())
+        if self._floor is None:
+            self._floor = level
+            return
+        time_constant = self.fall_time_seconds if level < self._floor else self.rise_time_seconds
+        alpha = 1. - math.exp(-frames / (time_constant * self.sample_rate))
+        self._floor += alpha * (level - self._floor)
+
+    def reset(self) -> None:
+        self._floor = None
@@ -0,0 +1,227 @@
+"""
+Rolling archive of captured audio for replaying missed or misrecognized instructions.
+
+Export the last 30 seconds of an archive as wav file and list the recorded events, for example:
+    python -m src.blackbox export --archive lurker/blackbox --last 30 missed.wav
+    python -m src.blackbox events --archive lurker/blackbox
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import wave
+from threading import Lock
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+from src import log
+
+_HEADER_MAGIC = 0x4C524B424F58  # "LRKBOX"
+# header fields
+_MAGIC, _SAMPLE_RATE, _CAPACITY, _SAMPLE_COUNT, _LAST_WRITE_TIME_US = range(5)
+_HEADER_FIELD_COUNT = 5
+
+
+class AudioBlackBox:
+    """
+    Fixed-size circular archive of audio samples backed by a memory-mapped file. Writing copies samples into the
+    mapped pages without allocating buffers and leaves flushing to the operating system, so capturing is not stalled
+    by disk writes. Events like detector decisions or transcriptions are indexed by absolute sample offsets in a
+    separate, bounded file next to the samples.
+    """
+
+    def __init__(self, directory: str, seconds: float, sample_rate: int, max_event_count: int = 10_000, read_only: bool = False):
+        """
+        :param read_only: If true, an existing archive is opened for reading, e.g. while lurker keeps writing to it.
+        :raises ValueError: If read_only is true and there is no archive with the given parameters in the directory.
+        """
+        self._logger = log.new_logger(self.__class__.__name__)
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.capacity = round(seconds * sample_rate)
+        self.max_event_count = max_event_count
+        self.events_path = os.path.join(directory, "events.jsonl")
+        self._events_lock = Lock()
+        self._event_count = _count_lines(self.events_path)
+
+        header_path = os.path.join(directory, "audio.head")
+        samples_path = os.path.join(directory, "audio.raw")
+        if read_only:
+            self._header = _open_existing_header(header_path)
+            if (self._header[_SAMPLE_RATE] != sample_rate or self._header[_CAPACITY] != self.capacity
+                    or not os.path.isfile(samples_path) or os.path.getsize(samples_path) != self.capacity * 2):
+                raise ValueError(f"Audio archive at {directory} is incomplete or does not match: seconds={seconds}, sample_rate={sample_rate}")
+            self._samples = np.memmap(samples_path, dtype=np.int16, mode="r", shape=(self.capacity,))
+            return
+        self._header = _open_header(header_path)
+        if (self._header[_MAGIC] != _HEADER_MAGIC or self._header[_SAMPLE_RATE] != sample_rate
+                or self._header[_CAPACITY] != self.capacity or not os.path.exists(samples_path)):
+            self._logger.info(f"Creating new audio archive: directory={directory}, seconds={seconds}, sample_rate={sample_rate}")
+            self._header[:] = [_HEADER_MAGIC, sample_rate, self.capacity, 0, 0]
+            self._samples = np.memmap(samples_path, dtype=np.int16, mode="w+", shape=(self.capacity,))
+            with self._events_lock:
+                open(self.events_path, "w").close()
+                self._event_count = 0
+        else:
+            self._logger.info(f"Continuing audio archive: directory={directory}, sample_count={self.sample_count}")
+            self._samples = np.memmap(samples_path, dtype=np.int16, mode="r+", shape=(self.capacity,))
+
+    @property
+    def sample_count(self) -> int:
+        """The absolute number of samples ever written to this archive."""
+        return int(self._header[_SAMPLE_COUNT])
+
+    @property
+    def first_available_offset(self) -> int:
+        return max(0, self.sample_count - self.capacity)
+
+    def write(self, block: np.ndarray) -> None:
+        """
+        Intended to be called from the capture callback.
+        """
+        sample_count = int(self._header[_SAMPLE_COUNT])
+        if len(block) > self.capacity:
+            sample_count += len(block) - self.capacity
+            block = block[-self.capacity:]
+        start = sample_count % self.capacity
+        head_length = min(len(block), self.capacity - start)
+        self._samples[start:start + head_length] = block[:head_length]
+        self._samples[:len(block) - head_length] = block[head_length:]
+        self._header[_SAMPLE_COUNT] = sample_count + len(block)
+        self._header[_LAST_WRITE_TIME_US] = int(time.time() * 1e6)
+
+    def record_event(self, kind: str, start_offset: int, end_offset: int, **details: Any) -> None:
+        """
+        :param kind: The kind of event, for example "keyword_window" or "instruction".
+        :param start_offset: The absolute offset of the first sample the event refers to.
+        :param end_offset: The absolute offset after the last sample the event refers to.
+        """
+        event = {"kind": kind, "start_offset": start_offset, "end_offset": end_offset, "time": time.time()} | details
+        with self._events_lock:
+            if self._event_count >= self.max_event_count:
+                self._drop_oldest_events()
+            with open(self.events_path, "a") as events_file:
+                events_file.write(json.dumps(event) + "\n")
+            self._event_count += 1
+
+    def _drop_oldest_events(self) -> None:
+        events = self.read_events()
+        # keep events still referring to archived audio, but at most half of the allowed number
+        kept = [event for event in events if event["end_offset"] > self.first_available_offset][-(self.max_event_count // 2):]
+        with open(self.events_path, "w") as events_file:
+            events_file.writelines(json.dumps(event) + "\n" for event in kept)
+        self._event_count = len(kept)
+
+    def read_events(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.events_path):
+            return []
+        with open(self.events_path) as events_file:
+            return [json.loads(line) for line in events_file if len(line.strip()) > 0]
+
+    def offset_at(self, timestamp: float) -> int:
+        """
+        :return: The approximate absolute offset of the sample captured at the given unix timestamp.
+        """
+        last_write_time = self._header[_LAST_WRITE_TIME_US] / 1e6
+        return self.sample_count - round((last_write_time - timestamp) * self.sample_rate)
+
+    def export_wav(self, start_offset: int, end_offset: int, path: str) -> int:
+        """
+        Writes the archived samples in the given range to a mono 16 bit wav file. The range is clipped to the samples
+        still available.
+        :return: The number of exported samples.
+        """
+        start_offset = max(start_offset, self.first_available_offset)
+        end_offset = min(end_offset, self.sample_count)
+        indices = np.arange(start_offset, max(start_offset, end_offset)) % self.capacity
+        samples = np.asarray(self._samples[indices], dtype=np.int16)
+        with wave.open(path, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(samples.tobytes())
+        return len(samples)
+
+
+def _open_header(path: str) -> np.memmap:
+    mode = "r+" if _is_header(path) else "w+"
+    return np.memmap(path, dtype=np.int64, mode=mode, shape=(_HEADER_FIELD_COUNT,))
+
+
+def _open_existing_header(path: str) -> np.memmap:
+    """
+    :raises ValueError: If there is no archive header at the given path.
+    """
+    if not _is_header(path):
+        raise ValueError(f"No audio archive found at {os.path.dirname(path)}")
+    header = np.memmap(path, dtype=np.int64, mode="r", shape=(_HEADER_FIELD_COUNT,))
+    if header[_MAGIC] != _HEADER_MAGIC:
+        raise ValueError(f"No audio archive found at {os.path.dirname(path)}")
+    return header
+
+
+def _is_header(path: str) -> bool:
+    return os.path.isfile(path) and os.path.getsize(path) == _HEADER_FIELD_COUNT * 8
+
+
+def _count_lines(path: str) -> int:
+    if not os.path.exists(path):
+        return 0
+    with open(path) as file:
+        return sum(1 for _ in file)
+
+
+def _read_archive(directory: str) -> AudioBlackBox:
+    """
+    :raises ValueError: If there is no complete archive in the directory.
+    """
+    header = _open_existing_header(os.path.join(directory, "audio.head"))
+    sample_rate = int(header[_SAMPLE_RATE])
+    return AudioBlackBox(directory, seconds=int(header[_CAPACITY]) / sample_rate, sample_rate=sample_rate, read_only=True)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Inspect a lurker audio archive.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Export a range of archived audio as wav file.")
+    export_parser.add_argument("--archive", required=True, help="Directory of the archive.")
+    export_parser.add_argument("--last", type=float, help="Export the last given number of seconds.")
+    export_parser.add_argument("--from-time", type=float, help="Unix timestamp of the first sample to export.")
+    export_parser.add_argument("--to-time", type=float, help="Unix timestamp of the last sample to export.")
+    export_parser.add_argument("--from-offset", type=int, help="Absolute offset of the first sample to export.")
+    export_parser.add_argument("--to-offset", type=int, help="Absolute offset after the last sample to export.")
+    export_parser.add_argument("output", help="Path of the wav file to write.")
+    events_parser = subparsers.add_parser("events", help="Print the recorded events.")
+    events_parser.add_argument("--archive", required=True, help="Directory of the archive.")
+    args = parser.parse_args(argv)
+
+    try:
+        black_box = _read_archive(args.archive)
+    except (ValueError, OSError) as e:
+        sys.exit(f"Could not read audio archive: {e}")
+    if args.command == "events":
+        for event in black_box.read_events():
+            print(json.dumps(event))
+        return
+
+    start_offset, end_offset = black_box.first_available_offset, black_box.sample_count
+    if args.last is not None:
+        start_offset = end_offset - int(args.last * black_box.sample_rate)
+    if args.from_time is not None:
+        start_offset = black_box.offset_at(args.from_time)
+    if args.to_time is not None:
+        end_offset = black_box.offset_at(args.to_time)
+    if args.from_offset is not None:
+        start_offset = args.from_offset
+    if args.to_offset is not None:
+        end_offset = args.to_offset
+    exported = black_box.export_wav(start_offset, end_offset, args.output)
+    print(f"Exported {exported} samples ({exported / black_box.sample_rate:.2f}s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+from dataclasses import dataclass
+from typing import Optional, Dict, Any
+
+import numpy as np
+import sounddevice as sd
+
+from src import log
+from src.config import CaptureConfig
+from src.resample import PolyphaseResampler
+
+LOGGER = log.new_logger(__name__)
+
+
+@dataclass(frozen=True)
+class CaptureFormat:
+    sample_rate: int
+    channels: int
+    dtype: str
+
+
+def probe_input_format(input_device_name: Optional[str], capture_config: CaptureConfig, fallback_sample_rate: int) -> CaptureFormat:
+    """
+    Determines the format to capture audio from the given device in. Unspecified settings are taken from the
+    capabilities reported by the device.
+    :param fallback_sample_rate: The sample rate to capture mono audio at if the device does not support the
+    configured format.
+    """
+    fallback = CaptureFormat(sample_rate=fallback_sample_rate, channels=1, dtype=capture_config.dtype)
+    try:
+        device_info: Dict[str, Any] = sd.query_devices(input_device_name, "input")
+    except ValueError as e:
+        LOGGER.warning(f"Could not query input device {input_device_name}: {e} - Capturing at {fallback}")
+        return fallback
+    capture_format = CaptureFormat(
+        sample_rate=capture_config.sample_rate or int(device_info["default_samplerate"]),
+        channels=capture_config.channels or max(1, min(2, int(device_info["max_input_channels"]))),
+        dtype=capture_config.dtype
+    )
+    if not capture_config.probe:
+        return capture_format
+    LOGGER.info(f"Probing input device '{device_info['name']}': default_samplerate={device_info['default_samplerate']}, "
+                f"max_input_channels={device_info['max_input_channels']}, default_low_input_latency={device_info['default_low_input_latency']}, "
+                f"default_high_input_latency={device_info['default_high_input_latency']}")
+    try:
+        sd.check_input_settings(device=input_device_name, channels=capture_format.channels,
+                                dtype=capture_format.dtype, samplerate=capture_format.sample_rate)
+    except Exception as e:
+        LOGGER.warning(f"Input device does not support {capture_format}: {e} - Capturing at {fallback}")
+        return fallback
+    return capture_format
+
+
+class BlockConverter:
+    """
+    Mixes captured blocks down to mono and resamples them to the sample rate expected by the transcription engine.
+    Blocks already captured in the expected format are passed through without copying.
+    """
+
+    def __init__(self, capture_format: CaptureFormat, output_sample_rate: int, output_dtype: np.dtype, resampler_half_length: int):
+        self.capture_format = capture_format
+        self.output_dtype = np.dtype(output_dtype)
+        self.resampler = PolyphaseResampler(capture_format.sample_rate, output_sample_rate, resampler_half_length)
+        input_dtype = np.dtype(capture_format.dtype)
+        output_max = np.iinfo(self.output_dtype).max
+        # scale from the full range of the input format to the full range of the output format
+        self._scale = output_max if input_dtype.kind == "f" else (output_max + 1) / (np.iinfo(input_dtype).max + 1)
+        self.is_passthrough = self.resampler.is_passthrough and capture_format.channels == 1 and input_dtype == self.output_dtype
+
+    def reset(self) -> None:
+        """
+        Discards the resampling history, for example when a new stream is started.
+        """
+        self.resampler.reset()
+
+    def convert(self, indata: np.ndarray) -> np.ndarray:
+        """
+        :param indata: Captured block with one column per channel.
+        :return: The converted mono samples.
+        """
+        if self.is_passthrough:
+            return indata[:, 0]
+        if self.capture_format.channels == 1:
+            mono = indata[:, 0].astype(np.float32)
+        else:
+            mono = indata.mean(axis=1, dtype=np.float32)
+        resampled = self.resampler.process(mono)
+        limits = np.iinfo(self.output_dtype)
+        return np.clip(np.rint(resampled * self._scale), limits.min, limits.max).astype(self.output_dtype)
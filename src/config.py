@@ -2,21 +2,34 @@ import dataclasses
 import json
 import os
 from dataclasses import dataclass, field
-from typing import Dict, Union, Optional, List, Any
+from threading import Thread
+from time import sleep
+from typing import Dict, Union, Optional, List, Any, Callable, Tuple
 
 from src import log
 
 LURKER_KEYWORD = "LURKER_KEYWORD"
 LURKER_MODEL = "LURKER_MODEL"
+LURKER_INSTRUCTION_MODEL = "LURKER_INSTRUCTION_MODEL"
+LURKER_INSTRUCTION_MODEL_MIN_LOGPROB = "LURKER_INSTRUCTION_MODEL_MIN_LOGPROB"
+LURKER_INSTRUCTION_MODEL_LAZY = "LURKER_INSTRUCTION_MODEL_LAZY"
 LURKER_LOG_LEVEL = "LURKER_LOG_LEVEL"
 LURKER_LOG_FILE = "LURKER_LOG_FILE"
 LURKER_INPUT_DEVICE = "LURKER_INPUT_DEVICE"
 LURKER_OUTPUT_DEVICE = "LURKER_OUTPUT_DEVICE"
+LURKER_AUDIO_SOURCES = "LURKER_AUDIO_SOURCES"
 LURKER_LANGUAGE = "LURKER_LANGUAGE"
 LURKER_SPEECH_CONFIG = "LURKER_SPEECH_CONFIG"
 LURKER_HANDLER_MODULE = "LURKER_HANDLER_MODULE"
 LURKER_HANDLER_CONFIG = "LURKER_HANDLER_CONFIG"
 LURKER_ACTION_REFRESH_INTERVAL = "LURKER_ACTION_REFRESH_INTERVAL"
+LURKER_CONFIG_REFRESH_INTERVAL = "LURKER_CONFIG_REFRESH_INTERVAL"
+LURKER_FUZZY_MAX_DISTANCE_RATIO = "LURKER_FUZZY_MAX_DISTANCE_RATIO"
+LURKER_FUZZY_MIN_MARGIN = "LURKER_FUZZY_MIN_MARGIN"
+LURKER_BLACK_BOX_PATH = "LURKER_BLACK_BOX_PATH"
+LURKER_TRANSCRIPTION_SERVER = "LURKER_TRANSCRIPTION_SERVER"
+LURKER_TRANSCRIPTION_SERVER_FALLBACK = "LURKER_TRANSCRIPTION_SERVER_FALLBACK"
+LURKER_BLACK_BOX_SECONDS = "LURKER_BLACK_BOX_SECONDS"
 
 LOGGER = log.new_logger(__name__)
 
@@ -26,14 +39,25 @@ def _get_envs() -> Dict[str, str]:
         LURKER_LOG_LEVEL: os.environ.get(LURKER_LOG_LEVEL),
         LURKER_LOG_FILE: os.environ.get(LURKER_LOG_FILE),
         LURKER_MODEL: os.environ.get(LURKER_MODEL),
+        LURKER_INSTRUCTION_MODEL: os.environ.get(LURKER_INSTRUCTION_MODEL),
+        LURKER_INSTRUCTION_MODEL_MIN_LOGPROB: os.environ.get(LURKER_INSTRUCTION_MODEL_MIN_LOGPROB),
+        LURKER_INSTRUCTION_MODEL_LAZY: os.environ.get(LURKER_INSTRUCTION_MODEL_LAZY),
         LURKER_KEYWORD: os.environ.get(LURKER_KEYWORD),
         LURKER_INPUT_DEVICE: os.environ.get(LURKER_INPUT_DEVICE),
         LURKER_OUTPUT_DEVICE: os.environ.get(LURKER_OUTPUT_DEVICE),
+        LURKER_AUDIO_SOURCES: os.environ.get(LURKER_AUDIO_SOURCES),
         LURKER_LANGUAGE: os.environ.get(LURKER_LANGUAGE),
         LURKER_SPEECH_CONFIG: os.environ.get(LURKER_SPEECH_CONFIG),
         LURKER_HANDLER_MODULE: os.environ.get(LURKER_HANDLER_MODULE),
         LURKER_HANDLER_CONFIG: os.environ.get(LURKER_HANDLER_CONFIG),
         LURKER_ACTION_REFRESH_INTERVAL: os.environ.get(LURKER_ACTION_REFRESH_INTERVAL),
+        LURKER_CONFIG_REFRESH_INTERVAL: os.environ.get(LURKER_CONFIG_REFRESH_INTERVAL),
+        LURKER_FUZZY_MAX_DISTANCE_RATIO: os.environ.get(LURKER_FUZZY_MAX_DISTANCE_RATIO),
+        LURKER_FUZZY_MIN_MARGIN: os.environ.get(LURKER_FUZZY_MIN_MARGIN),
+        LURKER_BLACK_BOX_PATH: os.environ.get(LURKER_BLACK_BOX_PATH),
+        LURKER_BLACK_BOX_SECONDS: os.environ.get(LURKER_BLACK_BOX_SECONDS),
+        LURKER_TRANSCRIPTION_SERVER: os.environ.get(LURKER_TRANSCRIPTION_SERVER),
+        LURKER_TRANSCRIPTION_SERVER_FALLBACK: os.environ.get(LURKER_TRANSCRIPTION_SERVER_FALLBACK),
     }
     return {key: value for key, value in envs.items() if value is not None}
 
@@ -48,6 +72,78 @@ def _load_config_file(path: str) -> Dict[str, Any]:
     return cfg
 
 
+@dataclass(frozen=True)
+class DecodingConfig:
+    greedy: bool = True
+    """If true, each snippet is decoded in a single greedy pass. Otherwise, beam search is used."""
+    beam_size: int = 5
+    """Number of beams to use if greedy is false."""
+    token_limit_per_second: float = 8.
+    """Maximum number of tokens to decode per second of transcribed audio."""
+    min_token_limit: int = 8
+    """Lower bound of the maximum number of tokens to decode regardless of the audio duration."""
+    temperature_fallback: bool = False
+    """If true, snippets with a suspicious compression ratio or log-probability are decoded again with increasing temperatures."""
+    time_budget_seconds: Optional[float] = None
+    """Maximum wall-clock duration in seconds of a single transcription call including all fallbacks. Decoding stops at the first decoder step after the budget is exhausted."""
+    vocabulary_mode: str = "off"
+    """How instruction decoding is steered towards the literal keys of all actions: "off", "bias" towards tokens continuing a key or "constrain" the result to exactly one key, decoding freely if that seems unlikely."""
+    vocabulary_bias: float = 2.
+    """Value added to the logits of tokens continuing a literal key if vocabulary_mode is "bias"."""
+
+
+@dataclass(frozen=True)
+class CaptureConfig:
+    sample_rate: Optional[int] = None
+    """Sample rate in Hz at which audio is captured from the input device before it is resampled to 16 kHz. If not specified, the default sample rate of the device is used."""
+    channels: Optional[int] = None
+    """Number of channels captured from the input device and mixed down to mono. If not specified, the number of channels supported by the device, but at most 2."""
+    dtype: str = "int16"
+    """Sample format requested from the input device."""
+    block_size: int = 0
+    """Number of frames per capture callback. 0 lets the audio backend choose an optimal, possibly varying size."""
+    latency: Optional[Union[float, str]] = None
+    """Input latency in seconds or "low" or "high". If not specified, the default of the audio backend is used."""
+    probe: bool = True
+    """If true, the input device is checked for supporting the capture settings at startup. If it does not, capturing falls back to 16 kHz mono."""
+    resampler_half_length: int = 8
+    """Number of zero crossings on each side of the resampling lowpass filter. Larger values suppress aliasing better at the cost of computation and delay."""
+
+
+@dataclass(frozen=True)
+class SchedulerConfig:
+    enabled: bool = True
+    """If true, the keyword loop and transcription are adapted to the load of the machine. Each of up to max_level pressure levels makes checks less frequent, the detector stricter and decoding cheaper."""
+    max_level: int = 2
+    """Highest pressure level. From level 2 on, instructions are transcribed without LURKER_INSTRUCTION_MODEL."""
+    evaluation_interval_seconds: float = 2.
+    """Duration in seconds between evaluations of the pressure on the machine."""
+    latency_window: int = 10
+    """Number of most recent transcriptions whose durations are considered."""
+    max_latency_ratio: float = 0.5
+    """Ratio of transcription_timeout_seconds that the 90th percentile of recent transcription durations may reach before pressure is considered high."""
+    max_backlog: int = 2
+    """Number of transcriptions a listener may have submitted but not completed, e.g. after timeouts, before pressure is considered high."""
+    max_load_per_cpu: float = 1.
+    """One minute load average per CPU above which pressure is considered high."""
+    max_temperature_celsius: float = 75.
+    """Highest temperature of all thermal zones above which pressure is considered high."""
+    hold_seconds: float = 10.
+    """Minimum duration in seconds a pressure level is kept before it is raised further, giving the previous adaptation time to take effect."""
+    recovery_ratio: float = 0.7
+    """Ratio of the limits above which pressure is not considered low enough to lower the pressure level."""
+    recovery_seconds: float = 30.
+    """Duration in seconds pressure has to stay low before the pressure level is lowered by one."""
+    check_interval_factor: float = 2.
+    """Factor by which queue_check_interval_seconds is multiplied per pressure level."""
+    ambiance_level_factor_step: float = 0.25
+    """Value added to ambiance_level_factor per pressure level such that only louder speech is considered relevant."""
+    required_speech_ratio_step: float = 0.05
+    """Value added to required_speech_ratio per pressure level."""
+    token_limit_factor: float = 0.75
+    """Factor by which token_limit_per_second is multiplied per pressure level."""
+
+
 @dataclass(frozen=True)
 class SpeechConfig:
     instruction_queue_length_seconds: float = 3.
@@ -58,6 +154,10 @@ class SpeechConfig:
     """Absolute amplitude value under which a mean amplitude of an audio snippet is considered as silent and is not passed to the transcription engine."""
     queue_check_interval_seconds: float = 0.1
     """Duration in seconds to wait in between checks whether an an audio queue should be passed to the transcription engine."""
+    keyword_window_hop_seconds: float = 0.1
+    """Duration in seconds by which consecutive keyword windows are shifted. Windows completed in between two checks are evaluated as well."""
+    keyword_window_max_overlap_ratio: float = 0.5
+    """Maximum ratio of a relevant keyword window that may overlap the previously transcribed window. Windows overlapping more are not transcribed again."""
     speech_bucket_count: int = 60
     """Number of partitions of an audio queue over which mean amplitudes are computed in order to determine if the respective queue should be sent to the transcription engine."""
     required_leading_silence_ratio: float = 0.1
@@ -67,9 +167,23 @@ class SpeechConfig:
     required_trailing_silence_ratio: float = 0.2
     """Ratio of trailing silent partitions required to consider an audio queue relevant for passing it to the transcription engine."""
     ambiance_level_factor: float = 1.5
-    """Factor to determine the dynamic silence-threshold based on the mean amplitudes of past keyword-queue evaluations."""
+    """Factor to determine the dynamic silence-threshold based on the tracked ambient noise floor."""
+    ambiance_rise_time_seconds: float = 10.
+    """Time constant in seconds with which the tracked ambient noise floor follows louder surroundings."""
+    ambiance_fall_time_seconds: float = 1.
+    """Time constant in seconds with which the tracked ambient noise floor follows quieter surroundings."""
     transcription_timeout_seconds: float = 3
     """Maximum number of seconds to wait for a transcription before aborting."""
+    transcription_batch_window_seconds: float = 0.05
+    """When listening on several audio sources, duration in seconds to wait for concurrent transcription requests of other sources in order to transcribe them in one batch."""
+    decoding_config: DecodingConfig = field(default_factory=DecodingConfig)
+    """Limits of the decoding performed by the transcription engine."""
+    capture_config: CaptureConfig = field(default_factory=CaptureConfig)
+    """Format in which audio is captured from the input device."""
+    scheduler_config: SchedulerConfig = field(default_factory=SchedulerConfig)
+    """Adaptation of the keyword loop and transcription to the load of the machine."""
+    single_pass_instruction: bool = False
+    """If true, an instruction spoken right after the keyword within the same keyword window is acted upon without recording a separate instruction. Keyword windows are then transcribed once by LURKER_INSTRUCTION_MODEL, but without the vocabulary of the actions, which would steer the transcription away from the keyword. Consider raising keyword_queue_length_seconds such that keyword and instruction fit into one window."""
 
 
 @dataclass(frozen=True)
@@ -82,20 +196,42 @@ class LurkerConfig:
     """Name of the device that should be used for recording audio. This might also be a substring of the actual name."""
     LURKER_OUTPUT_DEVICE: Optional[str] = None
     """Name of the device that should be used for playing feedback sounds. This might also be a substring of the actual name."""
+    LURKER_AUDIO_SOURCES: List[Dict[str, Optional[str]]] = field(default_factory=list)
+    """Audio sources to listen on simultaneously, each given as an object with keys "input_device" and "output_device". Feedback sounds are played on the output device of the source that recorded the instruction. If empty, LURKER_INPUT_DEVICE and LURKER_OUTPUT_DEVICE are used."""
     LURKER_KEYWORD: List[str] = field(default_factory=lambda : ["hey john"])
     """A word sequence upon which lurker should start recording actions."""
     LURKER_MODEL: str = "tiny"
     """A model name or an absolute path to a model file that should be used by the transcription engine."""
+    LURKER_INSTRUCTION_MODEL: Optional[str] = None
+    """A model name or an absolute path to a model file that should be used for transcribing instructions. If not specified, LURKER_MODEL transcribes instructions as well."""
+    LURKER_INSTRUCTION_MODEL_MIN_LOGPROB: Optional[Union[float, str]] = None
+    """If specified, instructions are transcribed by LURKER_MODEL first and only handed to LURKER_INSTRUCTION_MODEL if the average log-probability of the result is below this value."""
+    LURKER_INSTRUCTION_MODEL_LAZY: Union[bool, str] = False
+    """If true, LURKER_INSTRUCTION_MODEL is loaded when it is needed for the first time instead of during startup."""
+    LURKER_TRANSCRIPTION_SERVER: Optional[str] = None
+    """If specified, audio is transcribed by the transcription server at this address instead of a local model, given as "host:port" or "unix:" followed by a socket path. Start a server with python -m src.transcription_server, which listens on this address as well."""
+    LURKER_TRANSCRIPTION_SERVER_FALLBACK: Union[bool, str] = True
+    """If true, LURKER_MODEL is loaded locally for transcribing while the transcription server is unavailable."""
     LURKER_LANGUAGE: str = "en"
     """The language of the spoken words that should be transcribed by lurker. Setting this value usually improves transcription time."""
     LURKER_SPEECH_CONFIG: SpeechConfig = field(default_factory=SpeechConfig)
     """Configuration of audio queues and how to determine if a queue should be handed over to the more expensive transcription process."""
-    LURKER_HANDLER_MODULE: str = "src.handlers.hue_client"
-    """Module name containing a single implementation of src.action.ActionHandler to be used for acting on recorded instructions."""
-    LURKER_HANDLER_CONFIG: Dict[str, str] = field(default_factory=dict)
-    """Configuration passed to the configured ActionHandler."""
+    LURKER_HANDLER_MODULE: Union[str, List[str]] = "src.handlers.hue_client"
+    """Module name or list of module names containing implementations of src.action.ActionHandler to be used for acting on recorded instructions. Actions name their handler by its class name and are passed to the handler of the first module otherwise."""
+    LURKER_HANDLER_CONFIG: Dict[str, Any] = field(default_factory=dict)
+    """Configuration passed to the loaded ActionHandlers. An entry named after the class name of a handler holds the configuration of that handler. If the handler of the first module has no such entry, all other entries are passed to it."""
     LURKER_ACTION_REFRESH_INTERVAL: Union[int, str] = 5
     """Duration in seconds between action reloading attempts."""
+    LURKER_CONFIG_REFRESH_INTERVAL: Optional[Union[float, str]] = 5
+    """Duration in seconds between checks of the configuration file for changes. Valid changes are applied to the running lurker, except for changes of audio devices, LURKER_HANDLER_MODULE and the black box, which require a restart. Set to null to disable live reloading."""
+    LURKER_FUZZY_MAX_DISTANCE_RATIO: Optional[Union[float, str]] = None
+    """If specified, an instruction not matching any action exactly is acted upon by the action with the most similar literal key, if the edit distance between their phonetic representations relative to the instruction part's length does not exceed this value, e.g. 0.2. Fuzzy matching is disabled by default, since a near miss may trigger any action."""
+    LURKER_FUZZY_MIN_MARGIN: Union[float, str] = 0.05
+    """Minimum difference of relative edit distances by which a fuzzy match has to be closer than the fuzzy match of any other action."""
+    LURKER_BLACK_BOX_PATH: Optional[str] = None
+    """If specified, all captured audio is continuously archived in this directory along with detector decisions and transcriptions. Export missed instructions with python -m src.blackbox. A relative path is resolved against the lurker home."""
+    LURKER_BLACK_BOX_SECONDS: Union[float, str] = 600
+    """Number of seconds of most recent audio kept in the archive of each audio source."""
 
     def to_pretty_str(self) -> str:
         key_value_strings = [f"{field_name}={value}" for field_name, value in dataclasses.asdict(self).items()]
@@ -120,8 +256,18 @@ def load_lurker_config(config_path: str) -> LurkerConfig:
         if type(speech_config_param_value) is not dict:
             # transform param value to a string and try to load it as a dictionary
             speech_config_param_value = json.loads(str(speech_config_param_value))
+        if "decoding_config" in speech_config_param_value:
+            speech_config_param_value = speech_config_param_value | {"decoding_config": DecodingConfig(**speech_config_param_value["decoding_config"])}
+        if "capture_config" in speech_config_param_value:
+            speech_config_param_value = speech_config_param_value | {"capture_config": CaptureConfig(**speech_config_param_value["capture_config"])}
+        if "scheduler_config" in speech_config_param_value:
+            speech_config_param_value = speech_config_param_value | {"scheduler_config": SchedulerConfig(**speech_config_param_value["scheduler_config"])}
         config_param_dict[LURKER_SPEECH_CONFIG] = SpeechConfig(**speech_config_param_value)
 
+    if LURKER_HANDLER_MODULE in config_param_dict and type(config_param_dict[LURKER_HANDLER_MODULE]) is str:
+        # may be a string representing a list from _get_envs
+        config_param_dict[LURKER_HANDLER_MODULE] = transform_to_list(config_param_dict[LURKER_HANDLER_MODULE])
+
     if LURKER_HANDLER_CONFIG in config_param_dict:
         handler_config_param_value = config_param_dict[LURKER_HANDLER_CONFIG]
         if type(handler_config_param_value) is not dict:
@@ -129,11 +275,119 @@ def load_lurker_config(config_path: str) -> LurkerConfig:
             handler_config_param_value = json.loads(str(handler_config_param_value))
             config_param_dict[LURKER_HANDLER_CONFIG] = handler_config_param_value
 
+    if LURKER_AUDIO_SOURCES in config_param_dict:
+        audio_sources_param_value = config_param_dict[LURKER_AUDIO_SOURCES]
+        if type(audio_sources_param_value) is not list:
+            # transform param value to a string and try to load it as a list
+            config_param_dict[LURKER_AUDIO_SOURCES] = json.loads(str(audio_sources_param_value))
+
     return LurkerConfig(**config_param_dict)
 
 
+def validate_lurker_config(config: LurkerConfig) -> None:
+    """
+    Checks values that would only fail once they are used.
+    :raises ValueError: If the configuration contains invalid values.
+    """
+    speech_config = config.LURKER_SPEECH_CONFIG
+    errors = []
+    for name in ("instruction_queue_length_seconds", "keyword_queue_length_seconds", "queue_check_interval_seconds",
+                 "keyword_window_hop_seconds", "ambiance_rise_time_seconds", "ambiance_fall_time_seconds",
+                 "transcription_timeout_seconds"):
+        if getattr(speech_config, name) <= 0:
+            errors.append(f"{name} must be positive")
+    for name in ("required_leading_silence_ratio", "required_speech_ratio", "required_trailing_silence_ratio", "keyword_window_max_overlap_ratio"):
+        if not 0 <= getattr(speech_config, name) <= 1:
+            errors.append(f"{name} must be within [0, 1]")
+    if speech_config.required_leading_silence_ratio + speech_config.required_speech_ratio + speech_config.required_trailing_silence_ratio > 1:
+        errors.append("required ratios must not sum up to more than 1")
+    if speech_config.speech_bucket_count < 1:
+        errors.append("speech_bucket_count must be positive")
+    if speech_config.decoding_config.vocabulary_mode not in ("off", "bias", "constrain"):
+        errors.append("vocabulary_mode must be one of off, bias or constrain")
+    if speech_config.capture_config.dtype not in ("int16", "int32", "float32"):
+        errors.append("capture dtype must be one of int16, int32 or float32")
+    try:
+        for value in (config.LURKER_ACTION_REFRESH_INTERVAL, config.LURKER_FUZZY_MIN_MARGIN, config.LURKER_BLACK_BOX_SECONDS):
+            float(value)
+        for value in (config.LURKER_FUZZY_MAX_DISTANCE_RATIO, config.LURKER_INSTRUCTION_MODEL_MIN_LOGPROB, config.LURKER_CONFIG_REFRESH_INTERVAL):
+            if value is not None:
+                float(value)
+    except ValueError as e:
+        errors.append(str(e))
+    if len(config.LURKER_KEYWORD) < 1:
+        errors.append("LURKER_KEYWORD must not be empty")
+    if len(errors) > 0:
+        raise ValueError(f"Invalid configuration: {', '.join(errors)}")
+
+
+def changed_fields(old: Any, new: Any) -> List[str]:
+    """
+    :return: The names of the fields of two instances of the same dataclass whose values differ.
+    """
+    return [f.name for f in dataclasses.fields(old) if getattr(old, f.name) != getattr(new, f.name)]
+
+
+class ConfigWatcher:
+    """
+    Periodically checks the configuration file for changes and passes valid new configurations on. Invalid
+    configurations are logged and ignored until the file changes again.
+    """
+
+    def __init__(self, config_path: str, config: LurkerConfig, on_change: Callable[[LurkerConfig], None]):
+        """
+        :param config: The configuration currently in use.
+        :param on_change: Called with the new configuration. If it raises, the configuration is considered as not applied.
+        """
+        self._logger = log.new_logger(self.__class__.__name__)
+        self.config_path = config_path
+        self.config = config
+        self.on_change = on_change
+        self._last_modification = self._get_modification()
+        self.reload_interval_s: float = 5
+
+    def _get_modification(self) -> Optional[Tuple[int, int]]:
+        if not os.path.exists(self.config_path):
+            return None
+        stat = os.stat(self.config_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def start_periodic_reloading_in_background(self, interval_duration_s: float) -> None:
+        """
+        :param interval_duration_s: The initial interval, which may be changed later on by setting reload_interval_s.
+        """
+        self._logger.info(f"Starting periodic reloading of the configuration: location={self.config_path}, interval_duration_s={interval_duration_s}")
+        self.reload_interval_s = interval_duration_s
+        def reloader() -> None:
+            while True:
+                sleep(self.reload_interval_s)
+                self.reload_if_changed()
+        Thread(target=reloader, name="lurker_config_reloader", daemon=True).start()
+
+    def reload_if_changed(self) -> None:
+        modification = self._get_modification()
+        if modification is None or modification == self._last_modification:
+            return
+        self._last_modification = modification
+        try:
+            new_config = load_lurker_config(self.config_path)
+            validate_lurker_config(new_config)
+        except Exception as e:
+            self._logger.error(f"Ignoring invalid configuration {self.config_path}: {type(e)} {e}")
+            return
+        changed = changed_fields(self.config, new_config)
+        if len(changed) < 1:
+            return
+        self._logger.info(f"Applying changed configuration: fields={changed}")
+        try:
+            self.on_change(new_config)
+        except Exception as e:
+            self._logger.error(f"Could not apply configuration: {type(e)} {e}", exc_info=e)
+            return
+        self.config = new_config
+
+
 def transform_to_list(original: str) -> List[str]:
-    print(f"about to transform: {original}")
     if original.startswith("[") and original.endswith("]"):
         return [item.replace("\"", "").replace("'", "").strip() for item in original[1:-1].split(",")]
     else:
@@ -0,0 +1,234 @@
+import math
+import re
+from typing import Dict, List, Tuple, Generic, TypeVar, Optional, Iterable, Set
+
+V = TypeVar("V")
+
+# ordered replacements folding letter groups which sound alike into one representation
+_PHONETIC_REPLACEMENTS = [
+    ("sch", "s"), ("ph", "f"), ("ck", "k"), ("dt", "t"), ("th", "t"), ("gh", "g"), ("ch", "k"),
+    ("ie", "i"), ("ei", "ai"), ("ey", "ai"), ("qu", "kv"),
+    ("c", "k"), ("z", "s"), ("y", "i"), ("w", "v"), ("v", "f"),
+]
+_REPEATED_CHARACTERS = re.compile(r"(.)\1+")
+_NON_ALNUM = re.compile(r"[^a-z0-9äöüß ]")
+_MAX_CACHED_WORD_COUNT = 4096
+
+
+def phonetic_encode(phrase: str) -> str:
+    """
+    :return: A lower case representation of the given phrase in which similarly sounding letter groups are folded
+    and repeated characters are collapsed.
+    """
+    encoded = _NON_ALNUM.sub("", phrase.lower())
+    encoded = " ".join(encoded.split())
+    for original, replacement in _PHONETIC_REPLACEMENTS:
+        encoded = encoded.replace(original, replacement)
+    return _REPEATED_CHARACTERS.sub(r"\1", encoded)
+
+
+def levenshtein(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """
+    :param max_distance: If given, computation stops as soon as the distance is known to exceed this value and only
+    cells within max_distance of the diagonal are computed.
+    :return: The edit distance between both strings or max_distance + 1 if it exceeds max_distance.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    band = len(a) if max_distance is None else max_distance
+    if len(a) - len(b) > band:
+        return band + 1
+    exceeded = band + 1
+    previous = [j if j <= band else exceeded for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, start=1):
+        low = max(1, i - band)
+        high = min(len(b), i + band)
+        current = [exceeded] * (len(b) + 1)
+        if i <= band:
+            current[0] = i
+        row_min = current[low - 1]
+        for j in range(low, high + 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != b[j - 1]))
+            current[j] = cost
+            if cost < row_min:
+                row_min = cost
+        if row_min > band:
+            return exceeded
+        previous = current
+    return min(previous[-1], exceeded)
+
+
+def _ngrams(encoded: str, n: int = 2) -> Set[str]:
+    padded = f"#{encoded}#"
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class _NGramIndex(Generic[V]):
+    """
+    Inverted index from character bigrams to phrases. Each edit operation changes at most two bigrams. Hence, a
+    phrase within distance k of a query shares all but at most 2k distinct bigrams of the query, which cheaply rules
+    out most phrases before the edit distance is computed.
+    """
+
+    def __init__(self):
+        self.phrases: List[str] = []
+        self.values: List[List[V]] = []
+        self._ids: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = {}
+        self._ids_by_length: Dict[int, List[int]] = {}
+
+    def add(self, encoded: str, value: V) -> None:
+        phrase_id = self._ids.get(encoded, None)
+        if phrase_id is not None:
+            self.values[phrase_id].append(value)
+            return
+        phrase_id = len(self.phrases)
+        self._ids[encoded] = phrase_id
+        self.phrases.append(encoded)
+        self.values.append([value])
+        for gram in _ngrams(encoded):
+            self._postings.setdefault(gram, []).append(phrase_id)
+        self._ids_by_length.setdefault(len(encoded), []).append(phrase_id)
+
+    def search(self, query: str, radius: int) -> List[Tuple[int, str, V]]:
+        """
+        :return: All entries whose phrase lies within the given distance of the query as (distance, phrase, value).
+        """
+        query_grams = _ngrams(query)
+        min_shared = len(query_grams) - 2 * radius
+        if min_shared < 1:
+            # the bigram filter does not apply: every phrase of suitable length is a candidate
+            candidates = [phrase_id for length in range(len(query) - radius, len(query) + radius + 1) for phrase_id in self._ids_by_length.get(length, ())]
+        else:
+            shared_counts: Dict[int, int] = {}
+            for gram in query_grams:
+                for phrase_id in self._postings.get(gram, ()):
+                    shared_counts[phrase_id] = shared_counts.get(phrase_id, 0) + 1
+            candidates = [phrase_id for phrase_id, count in shared_counts.items() if count >= min_shared]
+        found = []
+        for phrase_id in candidates:
+            phrase = self.phrases[phrase_id]
+            distance = levenshtein(query, phrase, radius)
+            if distance <= radius:
+                found.extend((distance, phrase, value) for value in self.values[phrase_id])
+        return found
+
+
+class _WordIndex(Generic[V]):
+    """
+    Inverted index from the words at each position to the phrases with a fixed word count.
+    """
+
+    def __init__(self, word_count: int):
+        self.phrases: List[List[str]] = []
+        self.values: List[List[V]] = []
+        self._ids: Dict[str, int] = {}
+        self._postings: List[Dict[str, Set[int]]] = [{} for _ in range(word_count)]  # position -> word -> phrase ids
+
+    def add(self, encoded: str, value: V) -> None:
+        phrase_id = self._ids.get(encoded, None)
+        if phrase_id is not None:
+            self.values[phrase_id].append(value)
+            return
+        phrase_id = len(self.phrases)
+        self._ids[encoded] = phrase_id
+        words = encoded.split(" ")
+        self.phrases.append(words)
+        self.values.append([value])
+        for position, word in enumerate(words):
+            self._postings[position].setdefault(word, set()).add(phrase_id)
+
+    def candidates(self, near_words: List[Dict[str, int]]) -> Set[int]:
+        """
+        :param near_words: For each position, the words a phrase may have at that position.
+        :return: The ids of the phrases with one of the given words at every position.
+        """
+        candidates: Optional[Set[int]] = None
+        for postings, words in zip(self._postings, near_words):
+            ids = set().union(*(postings[word] for word in words.keys() if word in postings))
+            candidates = ids if candidates is None else candidates & ids
+            if len(candidates) < 1:
+                break
+        return candidates or set()
+
+
+class FuzzyIndex(Generic[V]):
+    """
+    Index over phrases for looking up the phrase closest to some part of a text, tolerating spelling and sound-alike
+    deviations. Phrases are compared in their phonetic encoding and grouped by their word count such that each
+    contiguous word sequence of the text is only compared with phrases of the same word count. The distance between
+    a word sequence and a phrase is the sum of the edit distances of the words at the same positions. Words are looked
+    up in a bigram index over the words of all phrases, such that lookups stay fast for many phrases sharing a small
+    vocabulary.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, V]], max_distance_ratio: float, min_margin: float):
+        """
+        :param entries: Pairs of phrase and associated value.
+        :param max_distance_ratio: Maximum edit distance of a match relative to the length of the matched text.
+        :param min_margin: Minimum difference of relative distances by which the best match has to be closer than the
+        best match of any other value.
+        """
+        self.max_distance_ratio = max_distance_ratio
+        self.min_margin = min_margin
+        self._indices: Dict[int, _WordIndex[Tuple[str, V]]] = {}
+        self._words: _NGramIndex[str] = _NGramIndex()
+        # (word, radius) -> word of phrases -> distance, kept across lookups since instructions share most words
+        self._near_words: Dict[Tuple[str, int], Dict[str, int]] = {}
+        self.size = 0
+        vocabulary = set()
+        for phrase, value in entries:
+            encoded = phonetic_encode(phrase)
+            if len(encoded) < 1:
+                continue
+            words = encoded.split(" ")
+            self._indices.setdefault(len(words), _WordIndex(len(words))).add(encoded, (phrase, value))
+            for word in words:
+                if word not in vocabulary:
+                    vocabulary.add(word)
+                    self._words.add(word, word)
+            self.size += 1
+
+    def _word_radius(self, word: str) -> int:
+        # one more edit than the ratio allows such that a word may deviate more than the sequence as a whole
+        return math.ceil((self.max_distance_ratio + self.min_margin) * len(word)) + 1
+
+    def find(self, text: str) -> Optional[Tuple[str, V, float]]:
+        """
+        :return: The best matching phrase, its value and its relative distance or None if there is no match satisfying
+        the maximum distance ratio and the minimum margin.
+        """
+        words = phonetic_encode(text).split(" ")
+        if len(self._near_words) > _MAX_CACHED_WORD_COUNT:
+            self._near_words = {}
+        near_words = self._near_words
+        best_by_value: Dict[int, Tuple[float, str, V]] = {}  # id(value) -> (relative distance, phrase, value)
+        for word_count, index in self._indices.items():
+            for start in range(0, len(words) - word_count + 1):
+                window_words = words[start:start + word_count]
+                window_length = sum(len(word) for word in window_words) + word_count - 1
+                radius = math.floor((self.max_distance_ratio + self.min_margin) * window_length)
+                window_near_words = []
+                for word in window_words:
+                    key = (word, min(radius, self._word_radius(word)))
+                    if key not in near_words:
+                        near_words[key] = {near: distance for distance, near, _ in self._words.search(*key)}
+                    window_near_words.append(near_words[key])
+                for phrase_id in index.candidates(window_near_words):
+                    distance = sum(near[word] for near, word in zip(window_near_words, index.phrases[phrase_id]))
+                    if distance > radius:
+                        continue
+                    relative_distance = distance / window_length
+                    for phrase, value in index.values[phrase_id]:
+                        best = best_by_value.get(id(value), None)
+                        if best is None or relative_distance < best[0]:
+                            best_by_value[id(value)] = (relative_distance, phrase, value)
+        if len(best_by_value) < 1:
+            return None
+        ranked = sorted(best_by_value.values(), key=lambda entry: entry[0])
+        relative_distance, phrase, value = ranked[0]
+        if relative_distance > self.max_distance_ratio:
+            return None
+        if len(ranked) > 1 and ranked[1][0] - relative_distance < self.min_margin:
+            return None
+        return phrase, value, relative_distance
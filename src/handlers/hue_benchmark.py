@@ -0,0 +1,77 @@
+"""
+Measures how long HueClient takes to apply the actions of a lurker home against a local HueBridgeSimulator.
+
+Run from the repository root, for example:
+    python -m src.handlers.hue_benchmark --lurker-home lurker --latency 0.05 --rate-limit 10
+"""
+import argparse
+import os
+import statistics
+import time
+from typing import List
+
+from src import log
+from src.action import ActionRegistry
+from src.handlers.hue_bridge_simulator import HueBridgeSimulator
+from src.handlers.hue_client import HueClient
+
+LOGGER = log.new_logger(__name__)
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark HueClient against a simulated HueBridge.")
+    parser.add_argument("--lurker-home", default=os.getcwd() + "/lurker", help="Lurker home containing the actions to apply.")
+    parser.add_argument("--lights", type=int, default=4, help="Number of simulated lights.")
+    parser.add_argument("--repetitions", type=int, default=10, help="Number of times each action is applied.")
+    parser.add_argument("--latency", type=float, default=0., help="Seconds of delay added to every bridge request.")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Maximum bridge requests per second.")
+    parser.add_argument("--failure-rate", type=float, default=0., help="Probability of a bridge request failing.")
+    parser.add_argument("--log-level", default="CRITICAL", help="Log level during the benchmark.")
+    return parser.parse_args()
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def main() -> None:
+    args = _parse_args()
+    log.init_global_config(args.log_level)
+
+    simulator = HueBridgeSimulator(light_count=args.lights,
+                                   latency_seconds=args.latency,
+                                   max_requests_per_second=args.rate_limit,
+                                   failure_rate=args.failure_rate).start()
+    registry = ActionRegistry(os.path.abspath(args.lurker_home) + "/actions")
+    registry.load_actions_once()
+    client = HueClient(host=simulator.address, user=simulator.user, lurker_home=args.lurker_home)
+
+    print(f"bridge: lights={args.lights}, latency={args.latency}s, rate_limit={args.rate_limit}/s, failure_rate={args.failure_rate}")
+    print(f"{'action':<40} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'GET/apply':>10} {'PUT/apply':>10} {'limited':>8} {'failed':>7} {'exit!=0':>8}")
+    try:
+        for file_name, (_, action) in sorted(registry.actions.items()):
+            if action is None or not isinstance(action.value, dict):
+                # special commands like EXIT or SAVE do not apply scenes
+                continue
+            match = action.matches(action.keys[0])
+            durations = []
+            non_zero_exit_codes = 0
+            simulator.reset_request_counts()
+            for _ in range(args.repetitions):
+                # force the client to retrieve lights like after a fresh start
+                client.lights = {}
+                t_start = time.perf_counter()
+                non_zero_exit_codes += client.handle(action, match) != 0
+                durations.append(time.perf_counter() - t_start)
+            counts = simulator.request_counts
+            print(f"{file_name:<40} {statistics.mean(durations) * 1000:>9.1f} {_percentile(durations, .5) * 1000:>9.1f} "
+                  f"{_percentile(durations, .95) * 1000:>9.1f} {max(durations) * 1000:>9.1f} "
+                  f"{counts['GET'] / args.repetitions:>10.1f} {counts['PUT'] / args.repetitions:>10.1f} "
+                  f"{counts['rate_limited']:>8} {counts['failed']:>7} {non_zero_exit_codes:>8}")
+    finally:
+        simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import json
+import random
+import re
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread, Lock
+from typing import Dict, Any, Optional, List
+
+from src import log
+
+_LIGHTS_PATH = re.compile(r"^/api/(?P<user>[^/]+)/lights/?$")
+_LIGHT_STATE_PATH = re.compile(r"^/api/(?P<user>[^/]+)/lights/(?P<light_id>[^/]+)/state/?$")
+
+
+class HueBridgeSimulator:
+    """
+    Local stand-in for a HueBridge implementing the v1 endpoints used by src.handlers.hue_client.HueClient:
+    GET /api/{user}/lights and PUT /api/{user}/lights/{id}/state.
+    Each request may be delayed, rate limited or fail on purpose in order to observe the client under bridge slowness.
+    """
+
+    def __init__(self,
+                 light_count: int = 4,
+                 user: str = "simulator",
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency_seconds: float = 0.,
+                 max_requests_per_second: Optional[float] = None,
+                 failure_rate: float = 0.):
+        """
+        :param port: The port to listen on. Zero picks any free port.
+        :param latency_seconds: Delay added to every request.
+        :param max_requests_per_second: If given, requests exceeding this rate are answered with status 429 like a
+        real bridge under load.
+        :param failure_rate: Probability of answering a request with status 500.
+        """
+        self._logger = log.new_logger(self.__class__.__name__)
+        self.user = user
+        self.latency_seconds = latency_seconds
+        self.max_requests_per_second = max_requests_per_second
+        self.failure_rate = failure_rate
+        self.lights: Dict[str, Dict[str, Any]] = {
+            str(i): {"name": f"Light {i}", "state": {"on": False, "bri": 254, "hue": 8417, "sat": 140}}
+            for i in range(1, light_count + 1)
+        }
+        self.request_counts: Dict[str, int] = {"GET": 0, "PUT": 0, "rate_limited": 0, "failed": 0}
+        self._lock = Lock()
+        self._request_times: List[float] = []
+        self._server = ThreadingHTTPServer((host, port), self._create_request_handler_type())
+        self._server.daemon_threads = True
+
+    @property
+    def address(self) -> str:
+        """Host and port to pass as HueClient host."""
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self) -> "HueBridgeSimulator":
+        Thread(target=self._server.serve_forever, name="lurker_hue_bridge_simulator", daemon=True).start()
+        self._logger.info(f"Serving simulated HueBridge at {self.address}")
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_request_counts(self) -> None:
+        with self._lock:
+            self.request_counts = {key: 0 for key in self.request_counts}
+
+    def _admit(self, method: str) -> int:
+        """
+        :return: The status code the request should be answered with.
+        """
+        with self._lock:
+            self.request_counts[method] += 1
+            now = time.monotonic()
+            if self.max_requests_per_second is not None:
+                self._request_times = [t for t in self._request_times if now - t < 1.]
+                if len(self._request_times) >= self.max_requests_per_second:
+                    self.request_counts["rate_limited"] += 1
+                    return 429
+                self._request_times.append(now)
+            if random.random() < self.failure_rate:
+                self.request_counts["failed"] += 1
+                return 500
+        return 200
+
+    def _create_request_handler_type(self) -> type:
+        simulator = self
+
+        class _RequestHandler(BaseHTTPRequestHandler):
+
+            def log_message(self, format: str, *args: Any) -> None:
+                simulator._logger.log(1, format, *args)
+
+            def _respond(self, status: int, body: Any) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self, method: str) -> Optional[re.Match]:
+                time.sleep(simulator.latency_seconds)
+                status = simulator._admit(method)
+                if status != 200:
+                    self._respond(status, [{"error": {"type": status, "address": self.path}}])
+                    return None
+                match = (_LIGHTS_PATH if method == "GET" else _LIGHT_STATE_PATH).match(self.path)
+                if match is None or match.group("user") != simulator.user:
+                    self._respond(404, [{"error": {"type": 3, "address": self.path, "description": "resource not available"}}])
+                    return None
+                return match
+
+            def do_GET(self) -> None:
+                if self._handle("GET") is None:
+                    return
+                with simulator._lock:
+                    body = json.loads(json.dumps(simulator.lights))
+                self._respond(200, body)
+
+            def do_PUT(self) -> None:
+                match = self._handle("PUT")
+                if match is None:
+                    return
+                light_id = match.group("light_id")
+                state = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with simulator._lock:
+                    light = simulator.lights.get(light_id, None)
+                    if light is not None:
+                        light["state"].update(state)
+                if light is None:
+                    self._respond(404, [{"error": {"type": 3, "address": self.path, "description": "resource not available"}}])
+                    return
+                self._respond(200, [{"success": {f"/lights/{light_id}/state/{key}": value}} for key, value in state.items()])
+
+        return _RequestHandler
@@ -1,15 +1,72 @@
 import importlib
+import os
 import sys
-from typing import Optional, Union, List
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from threading import Thread, Lock
+from typing import Optional, Union, List, Dict, Tuple, Any, Match, Set
 
 from src import log, sound
 from src.action import ActionRegistry, ActionHandler, LoadedHandlerType, NOPHandler
-from src.config import LurkerConfig
+from src.blackbox import AudioBlackBox
+from src.config import LurkerConfig, DecodingConfig, ConfigWatcher, changed_fields
 from src.speech import SpeechToTextListener
-from src.transcription import Transcriber
+from src.utils import KeyParagraphMapping
+from src.remote_transcription import RemoteTranscriber, LazyTranscriber
+from src.scheduler import AdaptiveScheduler, adapt_config
 
 LOGGER = log.new_logger(__name__)
 
+# settings only applied on startup
+_RESTART_REQUIRED_FIELDS = {"LURKER_INPUT_DEVICE", "LURKER_OUTPUT_DEVICE", "LURKER_AUDIO_SOURCES", "LURKER_HANDLER_MODULE",
+                            "LURKER_BLACK_BOX_PATH", "LURKER_BLACK_BOX_SECONDS"}
+# settings determining the transcribers, which reuse loaded models when being rebuilt
+_TRANSCRIPTION_FIELDS = {"LURKER_MODEL", "LURKER_INSTRUCTION_MODEL", "LURKER_INSTRUCTION_MODEL_MIN_LOGPROB",
+                         "LURKER_INSTRUCTION_MODEL_LAZY", "LURKER_LANGUAGE", "LURKER_TRANSCRIPTION_SERVER",
+                         "LURKER_TRANSCRIPTION_SERVER_FALLBACK"}
+_TRANSCRIPTION_SPEECH_FIELDS = {"decoding_config", "transcription_batch_window_seconds", "transcription_timeout_seconds"}
+# share of the transcription timeout to wait for the transcription server
+_REMOTE_TIMEOUT_RATIO = 0.5
+
+
+@dataclass
+class Transcription:
+    """
+    The transcribers shared by all listeners.
+    """
+    keyword_transcriber: Any
+    instruction_transcriber: Any
+    local_transcribers: List[Any] = field(default_factory=list)
+    """The transcribers holding loaded models."""
+    closeable_transcribers: List[Any] = field(default_factory=list)
+    """The transcribers holding threads or connections."""
+
+    def loaded_models(self) -> Dict[str, Any]:
+        models = {}
+        for transcriber in self.local_transcribers:
+            models |= transcriber.loaded_models()
+        return models
+
+    def phrase_tokenizers(self) -> Set[Any]:
+        """
+        :return: The tokenizers vocabularies are built with by the transcribers holding loaded models.
+        """
+        return {tokenizer for transcriber in self.local_transcribers for tokenizer in transcriber.phrase_tokenizers()}
+
+    def update_decoding_config(self, decoding_config: DecodingConfig) -> None:
+        """
+        Changes the decoding options of the transcribers holding loaded models without rebuilding them.
+        """
+        for transcriber in self.local_transcribers:
+            transcriber.update_decoding_config(decoding_config)
+
+    def close(self) -> None:
+        """
+        Releases the threads and connections of replaced transcribers. Pending transcriptions are completed.
+        """
+        for transcriber in self.closeable_transcribers:
+            transcriber.close()
+
 
 class Lurker:
     """
@@ -18,58 +75,222 @@ class Lurker:
 
     def __init__(self,
                  registry: ActionRegistry,
-                 handler: ActionHandler,
-                 listener: SpeechToTextListener,
-                 input_device_name: str,
-                 output_device_name: str
+                 handlers: Dict[str, ActionHandler],
+                 listeners: List[SpeechToTextListener],
+                 lurker_home: Optional[str] = None,
+                 lurker_config: Optional[LurkerConfig] = None,
+                 transcription: Optional[Transcription] = None,
                  ):
+        """
+        :param handlers: The action handlers by the names the registry routes actions to.
+        :param lurker_home: If given along with the configuration, changes of the configuration file in it are applied
+        while running.
+        """
         self._logger = log.new_logger(self.__class__.__name__)
         self.registry = registry
-        self.handler = handler
-        self.listener = listener
-        self.input_device_name = input_device_name
-        self.output_device_name = output_device_name
+        self.handlers = handlers
+        # each handler acts in its own worker such that a slow handler does not delay the others
+        # handlers are not required to be thread safe
+        self._handler_executors = {
+            name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"lurker_handler_{name}") for name in handlers.keys()
+        }
+        self.listeners = listeners
+        self.lurker_home = lurker_home
+        self.configured_config = lurker_config
+        """The configuration as loaded from the configuration file."""
+        self.lurker_config = lurker_config
+        """The configuration in effect, i.e. the configured one adapted to the pressure level of the scheduler."""
+        self.transcription = transcription
+        self._apply_lock = Lock()
+        self._exit_code = 0
+        self._config_watcher: Optional[ConfigWatcher] = None
+        self._scheduler: Optional[AdaptiveScheduler] = None
+        self._retained_models: Dict[str, Any] = {}
+
+    def apply_config(self, lurker_config: LurkerConfig) -> None:
+        """
+        Applies the given configuration, adapted to the current pressure level if adaptive scheduling is enabled.
+        """
+        with self._apply_lock:
+            self.configured_config = lurker_config
+            level = 0
+            if self._scheduler is not None:
+                speech_config = lurker_config.LURKER_SPEECH_CONFIG
+                self._scheduler.configure(speech_config.scheduler_config, speech_config.transcription_timeout_seconds)
+                level = self._scheduler.level
+            self._apply_effective_config(adapt_config(lurker_config, level))
+
+    def _on_level_change(self, level: int) -> None:
+        with self._apply_lock:
+            self._apply_effective_config(adapt_config(self.configured_config, level))
+
+    def _apply_effective_config(self, lurker_config: LurkerConfig) -> None:
+        """
+        Rebuilds the components affected by changed settings and swaps them in once all of them have been built
+        successfully. Listeners apply a changed speech config as soon as their current keyword check or instruction
+        has been completed.
+        """
+        changed = set(changed_fields(self.lurker_config, lurker_config))
+        speech_changed = set(changed_fields(self.lurker_config.LURKER_SPEECH_CONFIG, lurker_config.LURKER_SPEECH_CONFIG))
+        if len(changed & _RESTART_REQUIRED_FIELDS) > 0:
+            self._logger.warning(f"Changes of {sorted(changed & _RESTART_REQUIRED_FIELDS)} take effect after restarting lurker")
+
+        handlers = None
+        if "LURKER_HANDLER_CONFIG" in changed:
+            handlers = dict(self.handlers)
+            for handler_type in LoadedHandlerType.get_implementations():
+                name = handler_type.__name__
+                try:
+                    handlers[name] = _new_handler(self.lurker_home, lurker_config, handler_type)
+                except Exception as e:
+                    self._logger.warning(f"Could not instantiate handler {handler_type}: {type(e)} {e} - Keeping handler {type(handlers.get(name, None))}", exc_info=e)
+        transcription = None
+        decoding_config = None
+        if self.transcription is not None:
+            if len(changed & _TRANSCRIPTION_FIELDS) > 0 or len(speech_changed & (_TRANSCRIPTION_SPEECH_FIELDS - {"decoding_config"})) > 0:
+                transcription = _new_transcription(lurker_config, len(self.listeners), self._reusable_models())
+            elif "decoding_config" in speech_changed:
+                # e.g. on changes of the pressure level: the models stay the same
+                decoding_config = lurker_config.LURKER_SPEECH_CONFIG.decoding_config
+
+        if changed & {"LURKER_LOG_LEVEL", "LURKER_LOG_FILE"}:
+            log.init_global_config(lurker_config.LURKER_LOG_LEVEL, file_name=lurker_config.LURKER_LOG_FILE)
+        if handlers is not None:
+            # the workers pass subsequent actions to the new instances
+            self.handlers = handlers
+            self._logger.info(f"Replaced action handlers: {list(handlers.keys())}")
+        if transcription is not None:
+            replaced_transcription, self.transcription = self.transcription, transcription
+            for listener in self.listeners:
+                listener.transcriber = transcription.keyword_transcriber
+                listener.instruction_transcriber = transcription.instruction_transcriber
+            replaced_transcription.close()
+            self.registry.discard_key_tries(replaced_transcription.phrase_tokenizers() - transcription.phrase_tokenizers())
+            self._logger.info("Replaced transcribers")
+        if decoding_config is not None:
+            self.transcription.update_decoding_config(decoding_config)
+            self._logger.info(f"Updated decoding config: {decoding_config}")
+        if changed & {"LURKER_FUZZY_MAX_DISTANCE_RATIO", "LURKER_FUZZY_MIN_MARGIN"}:
+            self.registry.configure_fuzzy_matching(*_fuzzy_parameters(lurker_config))
+        if "LURKER_ACTION_REFRESH_INTERVAL" in changed:
+            self.registry.reload_interval_s = int(lurker_config.LURKER_ACTION_REFRESH_INTERVAL)
+        if "LURKER_CONFIG_REFRESH_INTERVAL" in changed and self._config_watcher is not None and lurker_config.LURKER_CONFIG_REFRESH_INTERVAL is not None:
+            self._config_watcher.reload_interval_s = float(lurker_config.LURKER_CONFIG_REFRESH_INTERVAL)
+        for listener in self.listeners:
+            if "LURKER_KEYWORD" in changed:
+                listener.update_keyword(lurker_config.LURKER_KEYWORD)
+            if len(speech_changed) > 0:
+                listener.update_speech_config(lurker_config.LURKER_SPEECH_CONFIG)
+        self.lurker_config = lurker_config
+
+    def _reusable_models(self) -> Dict[str, Any]:
+        """
+        :return: The loaded models by their model path. Models of the configured configuration are retained even while
+        the pressure level does without them, such that they need not be loaded again once pressure drops.
+        """
+        models = self._retained_models | self.transcription.loaded_models()
+        configured_paths = {self.configured_config.LURKER_MODEL, self.configured_config.LURKER_INSTRUCTION_MODEL}
+        self._retained_models = {path: model for path, model in models.items() if path in configured_paths}
+        return models
+
+    def _transcription_backlog(self) -> int:
+        return max((listener.pending_transcription_count for listener in self.listeners), default=0)
 
-    def act(self, instruction: str) -> None:
+    def act(self, instruction: str, output_device_name: Optional[str]) -> None:
+        """
+        :param instruction: The recorded instruction.
+        :param output_device_name: The device to play feedback sounds on.
+        """
         finding = self.registry.find(instruction)
+        is_fuzzy = False
+        if finding is None:
+            finding = self.registry.find_fuzzy(instruction)
+            is_fuzzy = finding is not None
         if finding is None:
             self._logger.info(f"Could not find action for instruction '{instruction}'")
-            sound.play_no(self.output_device_name)
+            sound.play_no(output_device_name)
         else:
             action, match = finding
-            self._logger.debug(f"Found action for instruction {instruction}: action={action}, match={match}")
-            sound.play_understood(self.output_device_name)
-            try:
-                handler_exit_code = self.handler.handle(action, match)
-            except Exception as e:
-                self._logger.error(f"Unhandled exception when handling instruction {instruction}: {type(e)} {e}", exc_info=e)
-                handler_exit_code = 1
-
-            if handler_exit_code == 0:
-                self._logger.info(f"Successfully acted on instruction: {instruction}")
-                sound.play_ok(self.output_device_name)
-            else:
-                self._logger.info(f"Could not act on instruction: instruction={instruction}, handler_exit_code={handler_exit_code}")
-                sound.play_no(self.output_device_name)
+            handler_name = self.registry.route(action)
+            self._logger.debug(f"Found action for instruction {instruction}: action={action}, match={match}, is_fuzzy={is_fuzzy}, handler={handler_name}")
+            if handler_name not in self._handler_executors:
+                self._logger.info(f"Could not find handler for instruction: instruction={instruction}, handler={action.handler}")
+                sound.play_no(output_device_name)
+                return
+            sound.play_understood(output_device_name)
+            self._handler_executors[handler_name].submit(self._handle, handler_name, instruction, action, match, output_device_name)
+
+    def _handle(self, handler_name: str, instruction: str, action: KeyParagraphMapping, match: Match[str], output_device_name: Optional[str]) -> None:
+        try:
+            handler_exit_code = self.handlers[handler_name].handle(action, match)
+        except SystemExit as e:
+            LOGGER.info(f"Exit requested: code={e.code}")
+            self._stop(0 if e.code is None else e.code)
+            return
+        except Exception as e:
+            self._logger.error(f"Unhandled exception when handling instruction {instruction}: {type(e)} {e}", exc_info=e)
+            handler_exit_code = 1
+
+        if handler_exit_code == 0:
+            self._logger.info(f"Successfully acted on instruction: instruction={instruction}, handler={handler_name}")
+            sound.play_ok(output_device_name)
+        else:
+            self._logger.info(f"Could not act on instruction: instruction={instruction}, handler={handler_name}, handler_exit_code={handler_exit_code}")
+            sound.play_no(output_device_name)
+
+    def _listen(self, listener: SpeechToTextListener, keyword: List[str]) -> None:
+        try:
+            listener.start_listening(keyword=keyword, instruction_callback=lambda instruction: self.act(instruction, listener.output_device_name))
+        except SystemExit as e:
+            LOGGER.info(f"Exit requested: code={e.code}")
+            self._stop(0 if e.code is None else e.code)
+        except Exception as e:
+            LOGGER.error(f"Fatal error: {e}", exc_info=e)
+            self._stop(1)
+
+    def _stop(self, exit_code: Union[int, str]) -> None:
+        self._exit_code = exit_code
+        for listener in self.listeners:
+            listener.stop_listening()
 
     def start_main_loop(self, keyword: List[str], action_refresh_interval_s: Union[int, str] = 5) -> None:
         LOGGER.info("Initializing...")
         self.registry.load_actions_once()
         self.registry.start_periodic_reloading_in_background(interval_duration_s=int(action_refresh_interval_s))
+        if self.lurker_home is not None and self.lurker_config is not None and self.lurker_config.LURKER_CONFIG_REFRESH_INTERVAL is not None:
+            self._config_watcher = ConfigWatcher(self.lurker_home + "/config.json", self.lurker_config, self.apply_config)
+            self._config_watcher.start_periodic_reloading_in_background(float(self.lurker_config.LURKER_CONFIG_REFRESH_INTERVAL))
+        if self.lurker_config is not None and self.transcription is not None:
+            speech_config = self.lurker_config.LURKER_SPEECH_CONFIG
+            self._scheduler = AdaptiveScheduler(speech_config.scheduler_config, speech_config.transcription_timeout_seconds,
+                                                get_backlog=self._transcription_backlog, on_level_change=self._on_level_change)
+            for listener in self.listeners:
+                listener.on_transcription = self._scheduler.record_transcription
+            self._scheduler.start_in_background()
         sound.load_sounds()
 
         LOGGER.info("Start listening...")
-        sound.play_startup(self.output_device_name)
-        try:
-            self.listener.start_listening(keyword=keyword, instruction_callback=self.act)
-        except Exception as e:
-            LOGGER.error(f"Fatal error: {e}", exc_info=e)
-            exit(1)
+        listener_threads = []
+        for i, listener in enumerate(self.listeners):
+            sound.play_startup(listener.output_device_name)
+            thread = Thread(target=self._listen, args=(listener, keyword), name=f"lurker_listener_{i}", daemon=True)
+            thread.start()
+            listener_threads.append(thread)
+        for thread in listener_threads:
+            thread.join()
+        exit(self._exit_code)
+
+
+def _handler_module_names(lurker_config: LurkerConfig) -> List[str]:
+    module_names = lurker_config.LURKER_HANDLER_MODULE
+    if module_names is None:
+        return []
+    return [module_names] if type(module_names) is str else list(module_names)
 
 
 def _load_external_handler_module(module_name: Optional[str]) -> None:
     """
-    If the module contains a class extending ActionHandler, that class will trigger
+    If the module contains classes extending ActionHandler, these classes will trigger
     __init_subclass__ of ActionHandler and thereby be registered.
     """
     if module_name is None:
@@ -88,36 +309,134 @@ def get_new(lurker_home: str, lurker_config: LurkerConfig) -> Lurker:
     Blocks this thread.
     """
 
-    _load_external_handler_module(lurker_config.LURKER_HANDLER_MODULE)
+    for module_name in _handler_module_names(lurker_config):
+        _load_external_handler_module(module_name)
 
-    handler_type = LoadedHandlerType.get_implementation()
-    # inject lurker_home into handler configuration
-    handler_config_with_home = {"lurker_home": lurker_home} | lurker_config.LURKER_HANDLER_CONFIG
-    try:
-        handler = handler_type(**handler_config_with_home)
-    except Exception as e:
-        LOGGER.warning(f"Could not instantiate handler {handler_type}: {type(e)} {e} - Using default handler instead.", exc_info=e)
-        handler = NOPHandler()
-
-    LOGGER.info("Loaded action handler: %s", type(handler))
+    handlers: Dict[str, ActionHandler] = {}
+    for handler_type in LoadedHandlerType.get_implementations():
+        try:
+            handler = _new_handler(lurker_home, lurker_config, handler_type)
+        except Exception as e:
+            LOGGER.warning(f"Could not instantiate handler {handler_type}: {type(e)} {e} - Using default handler instead.", exc_info=e)
+            handler = NOPHandler()
+        LOGGER.info("Loaded action handler: name=%s, type=%s", handler_type.__name__, type(handler))
+        handlers[handler_type.__name__] = handler
 
     actions_path = lurker_home + "/actions"
-    registry = ActionRegistry(actions_path)
+    fuzzy_max_distance_ratio, fuzzy_min_margin = _fuzzy_parameters(lurker_config)
+    registry = ActionRegistry(actions_path, fuzzy_max_distance_ratio=fuzzy_max_distance_ratio, fuzzy_min_margin=fuzzy_min_margin,
+                              handler_names=list(handlers.keys()))
 
-    transcriber = Transcriber(
-        model_path=lurker_config.LURKER_MODEL,
-        spoken_language=lurker_config.LURKER_LANGUAGE
-    )
-    listener = SpeechToTextListener(
-        transcriber=transcriber,
-        input_device_name=lurker_config.LURKER_INPUT_DEVICE,
-        output_device_name=lurker_config.LURKER_OUTPUT_DEVICE,
-        speech_config=lurker_config.LURKER_SPEECH_CONFIG
-    )
+    audio_sources: List[Dict[str, Optional[str]]] = lurker_config.LURKER_AUDIO_SOURCES or [
+        {"input_device": lurker_config.LURKER_INPUT_DEVICE, "output_device": lurker_config.LURKER_OUTPUT_DEVICE}
+    ]
+    LOGGER.info("Listening on audio sources: %s", audio_sources)
+
+    transcription = _new_transcription(lurker_config, len(audio_sources))
+    listeners = [
+        SpeechToTextListener(
+            transcriber=transcription.keyword_transcriber,
+            input_device_name=audio_source.get("input_device"),
+            output_device_name=audio_source.get("output_device"),
+            speech_config=lurker_config.LURKER_SPEECH_CONFIG,
+            instruction_transcriber=transcription.instruction_transcriber,
+            instruction_vocabulary=registry.key_trie,
+            black_box=_new_black_box(lurker_home, lurker_config, i, len(audio_sources))
+        )
+        for i, audio_source in enumerate(audio_sources)
+    ]
     return Lurker(
         registry=registry,
-        handler=handler,
-        listener=listener,
-        input_device_name=lurker_config.LURKER_INPUT_DEVICE,
-        output_device_name=lurker_config.LURKER_OUTPUT_DEVICE
+        handlers=handlers,
+        listeners=listeners,
+        lurker_home=lurker_home,
+        lurker_config=lurker_config,
+        transcription=transcription
     )
+
+
+def _new_handler(lurker_home: str, lurker_config: LurkerConfig, handler_type: type) -> ActionHandler:
+    # inject lurker_home into handler configuration
+    handler_config_with_home = {"lurker_home": lurker_home} | _handler_config(lurker_config, handler_type.__name__)
+    return handler_type(**handler_config_with_home)
+
+
+def _handler_config(lurker_config: LurkerConfig, handler_name: str) -> Dict[str, Any]:
+    """
+    :return: The entry of LURKER_HANDLER_CONFIG named after the handler. If there is none, the default handler gets all
+    entries not named after a handler, as in configurations for a single handler, and any other handler gets none.
+    """
+    handler_config = lurker_config.LURKER_HANDLER_CONFIG
+    section = handler_config.get(handler_name, None)
+    if type(section) is dict:
+        return section
+    handler_types = LoadedHandlerType.get_implementations()
+    if handler_name != handler_types[0].__name__:
+        return {}
+    handler_names = {handler_type.__name__ for handler_type in handler_types}
+    return {key: value for key, value in handler_config.items() if key not in handler_names}
+
+
+def _fuzzy_parameters(lurker_config: LurkerConfig) -> Tuple[Optional[float], float]:
+    fuzzy_max_distance_ratio = lurker_config.LURKER_FUZZY_MAX_DISTANCE_RATIO
+    return None if fuzzy_max_distance_ratio is None else float(fuzzy_max_distance_ratio), float(lurker_config.LURKER_FUZZY_MIN_MARGIN)
+
+
+def _new_black_box(lurker_home: str, lurker_config: LurkerConfig, source_index: int, source_count: int) -> Optional[AudioBlackBox]:
+    if lurker_config.LURKER_BLACK_BOX_PATH is None:
+        return None
+    directory = os.path.join(lurker_home, lurker_config.LURKER_BLACK_BOX_PATH)
+    if source_count > 1:
+        directory = os.path.join(directory, f"source_{source_index}")
+    try:
+        return AudioBlackBox(directory, seconds=float(lurker_config.LURKER_BLACK_BOX_SECONDS), sample_rate=16_000)
+    except Exception as e:
+        LOGGER.warning(f"Could not open audio archive at {directory}: {type(e)} {e} - Continuing without archive.", exc_info=e)
+        return None
+
+
+def _new_transcription(lurker_config: LurkerConfig, audio_source_count: int, loaded_models: Optional[Dict[str, Any]] = None) -> Transcription:
+    """
+    :param loaded_models: Model instances by their model path to use instead of loading them again.
+    """
+    if lurker_config.LURKER_TRANSCRIPTION_SERVER is not None:
+        return _new_remote_transcription(lurker_config, loaded_models)
+    return _new_local_transcription(lurker_config, audio_source_count, loaded_models)
+
+
+def _new_local_transcription(lurker_config: LurkerConfig, audio_source_count: int, loaded_models: Optional[Dict[str, Any]]) -> Transcription:
+    # imported here such that nodes transcribing remotely do not need the transcription engine
+    from src.transcription import BatchingTranscriber, create_transcribers
+
+    transcriber, instruction_transcriber = create_transcribers(lurker_config, loaded_models)
+    keyword_transcriber = transcriber
+    if audio_source_count > 1:
+        # all sources share one model instance
+        keyword_transcriber = BatchingTranscriber(
+            transcriber,
+            max_batch_size=audio_source_count,
+            batch_window_seconds=lurker_config.LURKER_SPEECH_CONFIG.transcription_batch_window_seconds
+        )
+    return Transcription(keyword_transcriber, instruction_transcriber, local_transcribers=[transcriber, instruction_transcriber],
+                         closeable_transcribers=[keyword_transcriber] if keyword_transcriber is not transcriber else [])
+
+
+def _new_remote_transcription(lurker_config: LurkerConfig, loaded_models: Optional[Dict[str, Any]]) -> Transcription:
+    loaded_models = {} if loaded_models is None else loaded_models
+    fallback = None
+    if str(lurker_config.LURKER_TRANSCRIPTION_SERVER_FALLBACK).lower() == "true":
+        def load_local_transcriber():
+            from src.transcription import Transcriber
+            LOGGER.info(f"Creating local transcriber with model {lurker_config.LURKER_MODEL} as fallback for the transcription server")
+            return Transcriber(model_path=lurker_config.LURKER_MODEL, spoken_language=lurker_config.LURKER_LANGUAGE,
+                               decoding_config=lurker_config.LURKER_SPEECH_CONFIG.decoding_config,
+                               model=loaded_models.get(lurker_config.LURKER_MODEL, None))
+        fallback = LazyTranscriber(load_local_transcriber)
+    LOGGER.info(f"Transcribing on server {lurker_config.LURKER_TRANSCRIPTION_SERVER}: local_fallback={fallback is not None}")
+    # leaves the listener time for transcribing locally if the server does not answer in time
+    timeout_seconds = _REMOTE_TIMEOUT_RATIO * lurker_config.LURKER_SPEECH_CONFIG.transcription_timeout_seconds
+    # the server batches keyword windows of all sources and nodes
+    keyword_transcriber = RemoteTranscriber(lurker_config.LURKER_TRANSCRIPTION_SERVER, timeout_seconds=timeout_seconds, fallback=fallback)
+    instruction_transcriber = RemoteTranscriber(lurker_config.LURKER_TRANSCRIPTION_SERVER, timeout_seconds=timeout_seconds, is_instruction=True, fallback=fallback)
+    return Transcription(keyword_transcriber, instruction_transcriber, local_transcribers=[] if fallback is None else [fallback],
+                         closeable_transcribers=[keyword_transcriber, instruction_transcriber])
@@ -0,0 +1,267 @@
+"""
+Framed binary protocol between lurker nodes and a shared transcription server (see src.transcription_server) and the
+client used by the nodes. This module does not depend on the transcription engine such that nodes transcribing
+remotely do not need to install it.
+
+Each request consists of a header, the audio samples as little endian 16 bit integers and the optional vocabulary as
+newline separated UTF-8 phrases:
+    magic "LT" | version u8 | flags u8 | sample count u32 | vocabulary size in bytes u32 | samples | vocabulary
+Each response consists of a header and the transcription or the error message as UTF-8:
+    magic "LT" | version u8 | status u8 | text size in bytes u32 | text
+All header integers are in network byte order. A connection may carry any number of requests one after the other.
+"""
+import socket
+import struct
+import time
+from threading import Lock
+from typing import Optional, List, Tuple, Callable, Any, Iterable, Sequence, Dict
+
+import numpy as np
+
+from src import log
+from src.utils import VocabularyProvider
+
+MAGIC = b"LT"
+VERSION = 1
+REQUEST_HEADER = struct.Struct("!2sBBII")
+RESPONSE_HEADER = struct.Struct("!2sBBI")
+FLAG_INSTRUCTION = 1
+STATUS_OK = 0
+STATUS_ERROR = 1
+SAMPLE_DTYPE = np.dtype("<i2")
+MAX_SAMPLE_COUNT = 30 * 16_000
+MAX_VOCABULARY_SIZE = 1024 ** 2
+
+
+class ProtocolError(IOError):
+    pass
+
+
+class TranscriptionServerError(Exception):
+    pass
+
+
+def parse_address(address: str) -> Tuple[int, Any]:
+    """
+    :param address: Either "host:port" or "unix:" followed by the path of a unix socket.
+    :return: The socket family and the address as expected by the socket module.
+    """
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, separator, port = address.rpartition(":")
+    if separator == "" or not port.isdigit():
+        raise ValueError(f"Invalid transcription server address: {address}")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def receive_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = sock.recv(min(remaining, 1024 ** 2))
+        if len(chunk) == 0:
+            raise ProtocolError("Connection closed by peer")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def encode_request(data, phrases: Optional[Sequence[str]], is_instruction: bool) -> bytes:
+    samples = np.asarray(data, dtype=SAMPLE_DTYPE)
+    vocabulary = b"" if phrases is None else "\n".join(phrases).encode("utf-8")
+    flags = FLAG_INSTRUCTION if is_instruction else 0
+    return REQUEST_HEADER.pack(MAGIC, VERSION, flags, len(samples), len(vocabulary)) + samples.tobytes() + vocabulary
+
+
+def receive_request(sock: socket.socket) -> Tuple[np.ndarray, Optional[List[str]], bool]:
+    """
+    :return: The samples, the vocabulary phrases or None if no vocabulary has been sent and whether the samples contain
+    an instruction.
+    """
+    magic, version, flags, sample_count, vocabulary_size = REQUEST_HEADER.unpack(receive_exactly(sock, REQUEST_HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ProtocolError(f"Unsupported request: magic={magic}, version={version}")
+    if sample_count > MAX_SAMPLE_COUNT or vocabulary_size > MAX_VOCABULARY_SIZE:
+        raise ProtocolError(f"Request too large: sample_count={sample_count}, vocabulary_size={vocabulary_size}")
+    samples = np.frombuffer(receive_exactly(sock, sample_count * SAMPLE_DTYPE.itemsize), dtype=SAMPLE_DTYPE)
+    phrases = None
+    if vocabulary_size > 0:
+        phrases = receive_exactly(sock, vocabulary_size).decode("utf-8").split("\n")
+    return samples, phrases, bool(flags & FLAG_INSTRUCTION)
+
+
+def encode_response(status: int, text: str) -> bytes:
+    encoded_text = text.encode("utf-8")
+    return RESPONSE_HEADER.pack(MAGIC, VERSION, status, len(encoded_text)) + encoded_text
+
+
+def receive_response(sock: socket.socket) -> str:
+    """
+    :return: The transcription.
+    :raises TranscriptionServerError: If the server answered with an error.
+    """
+    magic, version, status, text_size = RESPONSE_HEADER.unpack(receive_exactly(sock, RESPONSE_HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ProtocolError(f"Unsupported response: magic={magic}, version={version}")
+    text = receive_exactly(sock, text_size).decode("utf-8")
+    if status != STATUS_OK:
+        raise TranscriptionServerError(text)
+    return text
+
+
+def _encode_phrase(phrase: str) -> Iterable[Sequence[int]]:
+    # "tokenizes" phrases into their bytes in order to recover them from the trie of a vocabulary provider
+    return [list(phrase.encode("utf-8"))]
+
+
+def vocabulary_phrases(vocabulary: VocabularyProvider) -> List[str]:
+    """
+    :return: The phrases of the given vocabulary.
+    """
+    return sorted(bytes(sequence).decode("utf-8") for sequence in vocabulary(_encode_phrase).sequences())
+
+
+class LazyTranscriber:
+    """
+    Creates a transcriber on first use, for example to load a local model only if the transcription server fails.
+    """
+
+    def __init__(self, create: Callable[[], Any]):
+        self._create = create
+        self._transcriber = None
+        self._decoding_config = None
+        self._lock = Lock()
+
+    def get(self) -> Any:
+        with self._lock:
+            if self._transcriber is None:
+                self._transcriber = self._create()
+                if self._decoding_config is not None:
+                    self._transcriber.update_decoding_config(self._decoding_config)
+            return self._transcriber
+
+    def loaded_models(self) -> Dict[str, Any]:
+        with self._lock:
+            return {} if self._transcriber is None else self._transcriber.loaded_models()
+
+    def phrase_tokenizers(self) -> List[Callable]:
+        with self._lock:
+            return [] if self._transcriber is None else self._transcriber.phrase_tokenizers()
+
+    def update_decoding_config(self, decoding_config: Any) -> None:
+        """
+        Applies the given decoding config to the transcriber, once it has been created.
+        """
+        with self._lock:
+            self._decoding_config = decoding_config
+            transcriber = self._transcriber
+        if transcriber is not None:
+            transcriber.update_decoding_config(decoding_config)
+
+    def transcribe(self, data, vocabulary: Optional[VocabularyProvider] = None) -> str:
+        return self.get().transcribe(data, vocabulary)
+
+
+class RemoteTranscriber:
+    """
+    Transcribes audio on a transcription server. Connections are kept open and reused by subsequent requests. If the
+    server can not be reached or fails, the fallback transcriber is used instead and the server is not contacted
+    again for the retry interval.
+    """
+
+    def __init__(self,
+                 address: str,
+                 timeout_seconds: float,
+                 is_instruction: bool = False,
+                 fallback: Optional[LazyTranscriber] = None,
+                 retry_interval_seconds: float = 30.):
+        """
+        :param address: Either "host:port" or "unix:" followed by the path of a unix socket.
+        :param timeout_seconds: Maximum duration to wait for connecting, sending or receiving.
+        :param is_instruction: If true, the server transcribes with its instruction model.
+        """
+        self._logger = log.new_logger(self.__class__.__name__)
+        self.address = address
+        self.family, self.socket_address = parse_address(address)
+        self.timeout_seconds = timeout_seconds
+        self.is_instruction = is_instruction
+        self.fallback = fallback
+        self.retry_interval_seconds = retry_interval_seconds
+        self._idle_connections: List[socket.socket] = []
+        self._lock = Lock()
+        self._retry_at = 0.
+        self._is_closed = False
+
+    def transcribe(self, data, vocabulary: Optional[VocabularyProvider] = None) -> str:
+        if time.monotonic() >= self._retry_at:
+            request = encode_request(data, None if vocabulary is None else vocabulary_phrases(vocabulary), self.is_instruction)
+            try:
+                return self._request(request)
+            except (OSError, TranscriptionServerError) as e:
+                if self.fallback is None:
+                    raise
+                self._retry_at = time.monotonic() + self.retry_interval_seconds
+                self._logger.warning(f"Could not transcribe on server {self.address}: {type(e)} {e} - Transcribing locally for the next {self.retry_interval_seconds}s")
+        return self.fallback.transcribe(data, vocabulary)
+
+    def close(self) -> None:
+        """
+        Closes the idle connections. Connections in use are closed once their request has been answered.
+        """
+        with self._lock:
+            self._is_closed = True
+            idle_connections, self._idle_connections = self._idle_connections, []
+        for sock in idle_connections:
+            sock.close()
+
+    def _request(self, request: bytes) -> str:
+        sock, is_reused = self._acquire_connection()
+        try:
+            return self._exchange(sock, request)
+        except (TranscriptionServerError, socket.timeout):
+            raise
+        except OSError:
+            if not is_reused:
+                raise
+            # the server may have closed the idle connection in the meantime, e.g. because it has been restarted
+            self._logger.debug("Reconnecting to transcription server")
+            return self._exchange(self._connect(), request)
+
+    def _exchange(self, sock: socket.socket, request: bytes) -> str:
+        try:
+            sock.sendall(request)
+            text = receive_response(sock)
+        except Exception:
+            sock.close()
+            raise
+        self._release_connection(sock)
+        return text
+
+    def _acquire_connection(self) -> Tuple[socket.socket, bool]:
+        """
+        :return: A connection to the server and whether it has been used before.
+        """
+        with self._lock:
+            if len(self._idle_connections) > 0:
+                return self._idle_connections.pop(), True
+        return self._connect(), False
+
+    def _release_connection(self, sock: socket.socket) -> None:
+        with self._lock:
+            if not self._is_closed:
+                self._idle_connections.append(sock)
+                return
+        sock.close()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(self.family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout_seconds)
+        try:
+            sock.connect(self.socket_address)
+        except OSError:
+            sock.close()
+            raise
+        if self.family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._logger.debug(f"Connected to transcription server {self.address}")
+        return sock
@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def design_lowpass(up: int, down: int, half_length: int, kaiser_beta: float = 8.) -> np.ndarray:
+    """
+    Designs a Kaiser-windowed sinc lowpass filter at the upsampled rate suppressing both the images of upsampling by
+    up and the aliases of downsampling by down.
+    :param half_length: Number of zero crossings of the sinc on each side of the center.
+    :return: The filter coefficients scaled by up to compensate the zeros inserted when upsampling.
+    """
+    ratio = max(up, down)
+    # cut off slightly below the output nyquist frequency to leave room for the transition band
+    cutoff = 0.95 / (2 * ratio)
+    length = 2 * half_length * ratio + 1
+    positions = np.arange(length) - (length - 1) / 2
+    coefficients = 2 * cutoff * np.sinc(2 * cutoff * positions) * np.kaiser(length, kaiser_beta)
+    return (up * coefficients / coefficients.sum()).astype(np.float32)
+
+
+class PolyphaseResampler:
+    """
+    Streaming rational resampler computing only the output samples actually needed. Conceptually, the input is
+    upsampled by inserting zeros, lowpass filtered and downsampled. Each output sample depends on one phase of the
+    filter only, so it is computed as dot product of the most recent input samples with that phase. Blocks of input
+    may have arbitrary lengths, the filter history is carried over from one block to the next.
+    """
+
+    def __init__(self, input_rate: int, output_rate: int, half_length: int = 8):
+        """
+        :param half_length: Number of zero crossings of the lowpass filter on each side. Larger values attenuate
+        aliasing better at the cost of computation and delay.
+        """
+        divisor = math.gcd(input_rate, output_rate)
+        self.input_rate = input_rate
+        self.output_rate = output_rate
+        self.up = output_rate // divisor
+        self.down = input_rate // divisor
+        self.is_passthrough = self.up == self.down
+        # delay of the output relative to the input in output samples, as the lowpass filter is centered on its middle coefficient
+        self.delay = 0. if self.is_passthrough else half_length * max(self.up, self.down) / self.down
+
+        coefficients = design_lowpass(self.up, self.down, half_length)
+        self.taps_per_phase = math.ceil(len(coefficients) / self.up)
+        coefficients = np.pad(coefficients, (0, self.taps_per_phase * self.up - len(coefficients)))
+        # phase p holds the coefficients p, p + up, p + 2 * up, ... reversed to apply them to chronological windows
+        self._phases = coefficients.reshape(self.taps_per_phase, self.up).T[:, ::-1].copy()
+        self.reset()
+
+    def reset(self) -> None:
+        self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+        # position of the next output sample at the upsampled rate relative to the start of the history
+        self._position = self.up * (self.taps_per_phase - 1)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        :param block: Mono input samples.
+        :return: The output samples completed by the given block as float32.
+        """
+        if self.is_passthrough:
+            return block.astype(np.float32, copy=False)
+        buffer = np.concatenate((self._history, block.astype(np.float32, copy=False)))
+        end_position = self.up * len(buffer)
+        positions = np.arange(self._position, end_position, self.down)
+        newest_inputs, phases = np.divmod(positions, self.up)
+        windows = sliding_window_view(buffer, self.taps_per_phase)[newest_inputs - (self.taps_per_phase - 1)]
+        output = np.einsum("ij,ij->i", windows, self._phases[phases])
+
+        next_position = self._position + len(positions) * self.down
+        self._position = next_position - self.up * len(block)
+        self._history = buffer[len(buffer) - (self.taps_per_phase - 1):]
+        return output
@@ -0,0 +1,187 @@
+import dataclasses
+import glob
+import math
+import os
+import time
+from collections import deque
+from threading import Thread, Lock
+from typing import Callable, Optional, Deque, Dict
+
+from src import log
+from src.config import LurkerConfig, SchedulerConfig
+
+_THERMAL_ZONE_TEMPERATURES = "/sys/class/thermal/thermal_zone*/temp"
+_LEVEL_NAMES = ["normal", "reduced", "minimal"]
+
+
+def read_temperature_celsius() -> Optional[float]:
+    """
+    :return: The highest temperature of all thermal zones or None if there are none.
+    """
+    temperatures = []
+    for path in glob.glob(_THERMAL_ZONE_TEMPERATURES):
+        try:
+            with open(path) as temperature_file:
+                temperatures.append(int(temperature_file.read().strip()) / 1000)
+        except (OSError, ValueError):
+            continue
+    return max(temperatures) if len(temperatures) > 0 else None
+
+
+def read_load_per_cpu() -> Optional[float]:
+    """
+    :return: The one minute load average per CPU or None if it is not available on this platform.
+    """
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        return None
+
+
+def level_name(level: int) -> str:
+    return _LEVEL_NAMES[level] if level < len(_LEVEL_NAMES) else f"level {level}"
+
+
+def adapt_config(lurker_config: LurkerConfig, level: int) -> LurkerConfig:
+    """
+    :return: The given configuration adapted to the given pressure level. Level 0 returns the configuration unchanged.
+    """
+    if level < 1:
+        return lurker_config
+    speech_config = lurker_config.LURKER_SPEECH_CONFIG
+    scheduler_config = speech_config.scheduler_config
+    decoding_config = speech_config.decoding_config
+    time_budget_seconds = 0.8 * speech_config.transcription_timeout_seconds
+    if decoding_config.time_budget_seconds is not None:
+        time_budget_seconds = min(time_budget_seconds, decoding_config.time_budget_seconds)
+    max_speech_ratio = 1 - speech_config.required_leading_silence_ratio - speech_config.required_trailing_silence_ratio
+    speech_config = dataclasses.replace(
+        speech_config,
+        queue_check_interval_seconds=speech_config.queue_check_interval_seconds * scheduler_config.check_interval_factor ** level,
+        ambiance_level_factor=speech_config.ambiance_level_factor + scheduler_config.ambiance_level_factor_step * level,
+        required_speech_ratio=min(max_speech_ratio, speech_config.required_speech_ratio + scheduler_config.required_speech_ratio_step * level),
+        decoding_config=dataclasses.replace(
+            decoding_config,
+            greedy=True,
+            temperature_fallback=False,
+            token_limit_per_second=decoding_config.token_limit_per_second * scheduler_config.token_limit_factor ** level,
+            time_budget_seconds=time_budget_seconds
+        )
+    )
+    instruction_model = lurker_config.LURKER_INSTRUCTION_MODEL if level < 2 else None
+    return dataclasses.replace(lurker_config, LURKER_SPEECH_CONFIG=speech_config, LURKER_INSTRUCTION_MODEL=instruction_model)
+
+
+class AdaptiveScheduler:
+    """
+    Tracks the pressure on the machine and derives a pressure level from it. Pressure is the highest of the following
+    ratios, each of which reaches 1 at its configured limit: recent transcription latency relative to the
+    transcription timeout, the transcription backlog of the listeners, the load average per CPU and the temperature.
+    The level is raised by one as soon as pressure exceeds 1, but at most once per hold duration, and lowered by one
+    once pressure has stayed below the recovery ratio for the recovery duration.
+    """
+
+    def __init__(self,
+                 scheduler_config: SchedulerConfig,
+                 transcription_timeout_seconds: float,
+                 get_backlog: Callable[[], int],
+                 on_level_change: Callable[[int], None]):
+        """
+        :param get_backlog: Returns the highest number of transcriptions submitted but not completed by a listener.
+        :param on_level_change: Called with the new level whenever the level changes.
+        """
+        self._logger = log.new_logger(self.__class__.__name__)
+        self.scheduler_config = scheduler_config
+        self.transcription_timeout_seconds = transcription_timeout_seconds
+        self.get_backlog = get_backlog
+        self.on_level_change = on_level_change
+        self.level = 0
+        self._latencies: Deque[float] = deque(maxlen=scheduler_config.latency_window)
+        self._latencies_lock = Lock()
+        self._low_pressure_since: Optional[float] = None
+        self._level_changed_at = time.monotonic()
+
+    def configure(self, scheduler_config: SchedulerConfig, transcription_timeout_seconds: float) -> None:
+        """
+        Applies changed settings. Disabling the scheduler returns to the normal level without notification, as the
+        caller applies the unadapted configuration anyway.
+        """
+        if not scheduler_config.enabled:
+            self.level = 0
+        with self._latencies_lock:
+            self._latencies = deque(self._latencies, maxlen=scheduler_config.latency_window)
+        self.scheduler_config = scheduler_config
+        self.transcription_timeout_seconds = transcription_timeout_seconds
+
+    def record_transcription(self, duration_seconds: float, timed_out: bool) -> None:
+        """
+        Intended to be called after each transcription.
+        """
+        with self._latencies_lock:
+            self._latencies.append(max(duration_seconds, self.transcription_timeout_seconds) if timed_out else duration_seconds)
+
+    def measure_pressures(self) -> Dict[str, float]:
+        """
+        :return: The available pressure ratios by their source.
+        """
+        scheduler_config = self.scheduler_config
+        pressures = {"backlog": self.get_backlog() / scheduler_config.max_backlog}
+        with self._latencies_lock:
+            latencies = sorted(self._latencies)
+        if len(latencies) > 0:
+            p90 = latencies[min(len(latencies) - 1, math.ceil(0.9 * len(latencies)) - 1)]
+            pressures["latency"] = p90 / (scheduler_config.max_latency_ratio * self.transcription_timeout_seconds)
+        load_per_cpu = read_load_per_cpu()
+        if load_per_cpu is not None:
+            pressures["load"] = load_per_cpu / scheduler_config.max_load_per_cpu
+        temperature = read_temperature_celsius()
+        if temperature is not None:
+            pressures["temperature"] = temperature / scheduler_config.max_temperature_celsius
+        return pressures
+
+    def evaluate(self) -> int:
+        """
+        Measures the pressure and adapts the level if necessary.
+        :return: The current level.
+        """
+        scheduler_config = self.scheduler_config
+        pressures = self.measure_pressures()
+        pressure = max(pressures.values())
+        now = time.monotonic()
+        level = self.level
+        if pressure > 1:
+            self._low_pressure_since = None
+            if self.level == 0 or now - self._level_changed_at >= scheduler_config.hold_seconds:
+                level = min(scheduler_config.max_level, self.level + 1)
+        elif pressure < scheduler_config.recovery_ratio:
+            if self._low_pressure_since is None:
+                self._low_pressure_since = now
+            elif now - self._low_pressure_since >= scheduler_config.recovery_seconds:
+                self._low_pressure_since = now
+                level = max(0, self.level - 1)
+        else:
+            self._low_pressure_since = None
+        self._logger.log(1, f"Measured pressures: {pressures}")
+        if level != self.level:
+            rounded = {source: round(value, 2) for source, value in pressures.items()}
+            self._logger.info(f"Changing mode: {level_name(self.level)} -> {level_name(level)}, pressures={rounded}")
+            self.level = level
+            self._level_changed_at = now
+            with self._latencies_lock:
+                # latencies measured in the previous mode do not tell about the new one
+                self._latencies.clear()
+            self.on_level_change(level)
+        return self.level
+
+    def start_in_background(self) -> None:
+        self._logger.info(f"Starting adaptive scheduling: {self.scheduler_config}")
+        def evaluator() -> None:
+            while True:
+                time.sleep(self.scheduler_config.evaluation_interval_seconds)
+                if not self.scheduler_config.enabled:
+                    continue
+                try:
+                    self.evaluate()
+                except Exception as e:
+                    self._logger.error(f"Could not evaluate pressure: {type(e)} {e}", exc_info=e)
+        Thread(target=evaluator, name="lurker_scheduler", daemon=True).start()
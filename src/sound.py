@@ -1,51 +1,66 @@
+import math
 import os
 import wave
-from typing import Dict, Optional
+from threading import Lock, Event
+from typing import Dict, Optional, List, Any
 
 import numpy as np
 import sounddevice as sd
 
 from src import log
+from src.resample import PolyphaseResampler
 
 LOGGER = log.new_logger(__name__)
 
 
 def play_ready(output_device_name: Optional[str]) -> None:
-    entry = _LoadedSounds.sounds.get("ready.wav", None)
-    _play_sound(output_device_name, entry, False)
+    _play_sound(output_device_name, "ready.wav", True)
 
 
 def play_startup(output_device_name: Optional[str]):
-    entry = _LoadedSounds.sounds.get("start.wav", None)
-    _play_sound(output_device_name, entry, False)
+    _play_sound(output_device_name, "start.wav", False)
 
 
 def play_no(output_device_name: Optional[str]):
-    entry = _LoadedSounds.sounds.get("no.wav", None)
-    _play_sound(output_device_name, entry, False)
+    _play_sound(output_device_name, "no.wav", False)
 
 
 def play_ok(output_device_name: Optional[str]):
-    entry = _LoadedSounds.sounds.get("ok.wav", None)
-    _play_sound(output_device_name, entry, False)
+    _play_sound(output_device_name, "ok.wav", False)
 
 
 def play_understood(output_device_name: Optional[str]):
-    entry = _LoadedSounds.sounds.get("understood.wav", None)
-    _play_sound(output_device_name, entry, True)
+    _play_sound(output_device_name, "understood.wav", False)
 
 
-def _play_sound(output_device_name: Optional[str], data: Optional[np.ndarray], blocking: bool) -> None:
-    if data is not None:
-        try:
-            sd.play(data, device=output_device_name, blocking=blocking)
-        except Exception as e:
-            LOGGER.warning(f"Could not play sound: {str(e)}")
+def _play_sound(output_device_name: Optional[str], sound_name: str, interrupt: bool) -> Optional[Event]:
+    """
+    Does not block the caller.
+    :param interrupt: If true, sounds currently playing on the device are stopped.
+    :return: An event which is set when the sound has been played completely or None if the sound could not be played.
+    """
+    if sound_name not in _LoadedSounds.sounds:
+        return None
+    try:
+        return _get_mixer(output_device_name).play(sound_name, interrupt)
+    except Exception as e:
+        LOGGER.warning(f"Could not play sound: {str(e)}")
+        return None
+
+
+def _get_mixer(output_device_name: Optional[str]) -> "_Mixer":
+    with _Mixers.lock:
+        mixer = _Mixers.mixers.get(output_device_name, None)
+        if mixer is None:
+            mixer = _Mixer(output_device_name)
+            _Mixers.mixers[output_device_name] = mixer
+        return mixer
 
 
 def load_sounds():
     LOGGER.info("Loading sounds")
     sounds = {}
+    sample_rates = {}
     resources_dir = os.scandir(os.path.dirname(__file__) + "/resources")
     for p in resources_dir:
         if p.name.endswith(".wav"):
@@ -58,11 +73,102 @@ def load_sounds():
                     # Reshape it into a 2D array separating the channels in columns.
                     data = np.reshape(interleaved, (-1, f.getnchannels()))
                     sounds[p.name] = data
+                    sample_rates[p.name] = f.getframerate()
             except Exception as e:
                 LOGGER.warning("Could not load sound from %s: %s", p.path, str(e))
     LOGGER.debug(f"Loaded sounds: size={len(sounds)}, files={sounds.keys()}")
     _LoadedSounds.sounds = sounds
+    _LoadedSounds.sample_rates = sample_rates
+    with _Mixers.lock:
+        for mixer in _Mixers.mixers.values():
+            mixer.prepare_sounds()
+
+
+def _prepare_sound(data: np.ndarray, sample_rate: int, target_sample_rate: int, target_channels: int) -> np.ndarray:
+    """
+    :return: The given integer sound data as float32 samples in [-1, 1] with the target sample rate and channel count.
+    """
+    samples = data.astype(np.float32) / np.iinfo(data.dtype).max
+    if sample_rate != target_sample_rate and len(samples) > 1:
+        samples = np.stack([_resample(channel, sample_rate, target_sample_rate) for channel in samples.T], axis=1)
+    if samples.shape[1] != target_channels:
+        samples = np.repeat(samples.mean(axis=1, keepdims=True), target_channels, axis=1)
+    return np.ascontiguousarray(samples)
+
+
+def _resample(samples: np.ndarray, sample_rate: int, target_sample_rate: int) -> np.ndarray:
+    """
+    :return: The given complete mono sound at the target sample rate, lowpass filtered to avoid aliasing.
+    """
+    resampler = PolyphaseResampler(sample_rate, target_sample_rate)
+    target_length = max(1, round(len(samples) * target_sample_rate / sample_rate))
+    delay = round(resampler.delay)
+    # flush the filter history such that the end of the sound is not cut off by the delay of the filter
+    flush_length = math.ceil((delay + 1) * sample_rate / target_sample_rate) + resampler.taps_per_phase
+    resampled = resampler.process(np.concatenate((samples, np.zeros(flush_length, dtype=np.float32))))
+    return resampled[delay:delay + target_length]
+
+
+class _Voice:
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+        self.position = 0
+        self.finished = Event()
+
+
+class _Mixer:
+    """
+    Keeps a single output stream open for one device and mixes all sounds currently playing on it.
+    Sounds are converted to the sample rate and channel count of the device once.
+    """
+
+    def __init__(self, output_device_name: Optional[str]):
+        device_info: Dict[str, Any] = sd.query_devices(output_device_name, "output")
+        self.sample_rate = int(device_info["default_samplerate"])
+        self.channels = max(1, min(2, int(device_info["max_output_channels"])))
+        self.sounds: Dict[str, np.ndarray] = {}
+        self.prepare_sounds()
+
+        self._voices: List[_Voice] = []
+        self._lock = Lock()
+        self.stream = sd.OutputStream(device=output_device_name, samplerate=self.sample_rate, channels=self.channels,
+                                      dtype="float32", callback=self._mix)
+        self.stream.start()
+        LOGGER.debug(f"Opened output stream: device={output_device_name}, sample_rate={self.sample_rate}, channels={self.channels}")
+
+    def prepare_sounds(self) -> None:
+        self.sounds = {name: _prepare_sound(data, _LoadedSounds.sample_rates[name], self.sample_rate, self.channels)
+                       for name, data in _LoadedSounds.sounds.items()}
+
+    def play(self, sound_name: str, interrupt: bool) -> Event:
+        voice = _Voice(self.sounds[sound_name])
+        with self._lock:
+            if interrupt:
+                for interrupted_voice in self._voices:
+                    interrupted_voice.finished.set()
+                self._voices.clear()
+            self._voices.append(voice)
+        return voice.finished
+
+    def _mix(self, outdata: np.ndarray, frames: int, t: Any, status: sd.CallbackFlags) -> None:
+        outdata.fill(0)
+        with self._lock:
+            for voice in self._voices:
+                chunk = voice.data[voice.position:voice.position + frames]
+                outdata[:len(chunk)] += chunk
+                voice.position += len(chunk)
+                if voice.position >= len(voice.data):
+                    voice.finished.set()
+            self._voices = [voice for voice in self._voices if not voice.finished.is_set()]
+        np.clip(outdata, -1., 1., out=outdata)
+
+
+class _Mixers:
+    mixers: Dict[Optional[str], _Mixer] = {}
+    lock = Lock()
 
 
 class _LoadedSounds:
     sounds: Dict[str, np.ndarray] = {}
+    sample_rates: Dict[str, int] = {}
@@ -1,49 +1,145 @@
 import math
 import time
 from collections import deque
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from threading import Lock
 from time import sleep
-from typing import Callable, Any, Optional, Collection, List
+from typing import Callable, Any, Optional, Collection, List, Union, TYPE_CHECKING
 
 import numpy as np
 import sounddevice as sd
 
 from src import log, sound
-from src.config import SpeechConfig
+from src.ambiance import AmbianceTracker
+from src.blackbox import AudioBlackBox
+from src.capture import BlockConverter, probe_input_format
+from src.config import SpeechConfig, changed_fields
 from src.text import filter_non_alnum
-from src.transcription import Transcriber
-from src.utils import KeyParagraphMapping
+from src.remote_transcription import RemoteTranscriber
+from src.utils import KeyParagraphMapping, VocabularyProvider
+from src.window import SlidingAudioWindow
+
+if TYPE_CHECKING:
+    # not imported at runtime such that nodes transcribing remotely do not need the transcription engine
+    from src.transcription import Transcriber, BatchingTranscriber, EscalatingTranscriber
 
 LOGGER = log.new_logger(__name__)
 
-class SpeechToTextListener:
+# speech config fields determining the size of buffers
+_KEYWORD_WINDOW_SPEECH_FIELDS = {"keyword_queue_length_seconds", "speech_bucket_count", "keyword_window_hop_seconds", "transcription_timeout_seconds"}
+_BUFFER_SPEECH_FIELDS = _KEYWORD_WINDOW_SPEECH_FIELDS | {"instruction_queue_length_seconds", "capture_config"}
 
-    _EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcription")
+
+class SpeechToTextListener:
 
     def __init__(self,
-                 transcriber: Transcriber,
+                 transcriber: Union["Transcriber", "BatchingTranscriber", RemoteTranscriber],
                  input_device_name: Optional[str],
                  output_device_name: Optional[str],
                  speech_config: SpeechConfig,
+                 instruction_transcriber: Optional[Union["Transcriber", "EscalatingTranscriber", RemoteTranscriber]] = None,
+                 instruction_vocabulary: Optional[VocabularyProvider] = None,
+                 black_box: Optional[AudioBlackBox] = None,
                  ):
+        """
+        :param transcriber: Transcribes keyword windows.
+        :param instruction_transcriber: Transcribes instructions. Defaults to the keyword transcriber.
+        :param instruction_vocabulary: Vocabulary to steer the transcription of instructions towards.
+        :param black_box: If given, all captured audio is archived in it along with detector decisions and transcriptions.
+        """
         self._logger = log.new_logger(self.__class__.__name__)
         self.transcriber = transcriber
+        self.instruction_transcriber = transcriber if instruction_transcriber is None else instruction_transcriber
+        self.instruction_vocabulary = instruction_vocabulary
+        self.black_box = black_box
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcription")
+        self.pending_transcription_count = 0
+        self._pending_transcription_count_lock = Lock()
+        self.on_transcription: Optional[Callable[[float, bool], None]] = None
+        """Called with the duration of each transcription and whether it timed out."""
 
         self.input_device_name = input_device_name
         self.output_device_name = output_device_name
 
         self.speech_config = speech_config
+        self._pending_speech_config: Optional[SpeechConfig] = None
+        self._pending_speech_config_lock = Lock()
+        self.keyword: Optional[KeyParagraphMapping] = None
 
         self.sample_rate = 16_000
         self.bit_depth = np.dtype(np.int16)
         #  seconds * samples_per_second * bits_per_sample / 8 = bytes required to store seconds of data
         #  For example: 3 seconds at 16_000 Hz at 16 bit require 96000 bytes (96 kb)
-        byte_count_per_second = int(self.sample_rate * np.iinfo(self.bit_depth).bits / 8)
-        self.keyword_queue = deque(maxlen=int(self.speech_config.keyword_queue_length_seconds * byte_count_per_second))
-        self.instruction_queue = deque(maxlen=int(self.speech_config.instruction_queue_length_seconds * byte_count_per_second))
+        self.byte_count_per_second = int(self.sample_rate * np.iinfo(self.bit_depth).bits / 8)
+        self._init_keyword_window()
+        # black box offset of the first sample of the keyword window
+        self._keyword_window_black_box_origin = 0
+        self._init_instruction_queue()
         self.is_listening = False
 
-        self.keyword_queue_bucket_means = deque(maxlen=100)
+        self._init_capture()
+
+        self.ambiance = AmbianceTracker(self.sample_rate,
+                                        rise_time_seconds=self.speech_config.ambiance_rise_time_seconds,
+                                        fall_time_seconds=self.speech_config.ambiance_fall_time_seconds)
+
+    def _init_keyword_window(self) -> None:
+        keyword_window_length = int(self.speech_config.keyword_queue_length_seconds * self.byte_count_per_second)
+        self.keyword_window_bucket_size = max(1, keyword_window_length // self.speech_config.speech_bucket_count)
+        self.keyword_window_hop_buckets = max(1, round(self.speech_config.keyword_window_hop_seconds * self.sample_rate / self.keyword_window_bucket_size))
+        # keep enough history to catch up on windows that passed by while a transcription was running
+        keyword_history_length = keyword_window_length + int((self.speech_config.transcription_timeout_seconds + 1) * self.sample_rate)
+        self.keyword_window = SlidingAudioWindow(keyword_history_length, self.keyword_window_bucket_size, self.bit_depth)
+        self._next_keyword_window_end = self.speech_config.speech_bucket_count
+        self._last_transcribed_keyword_window = (0, 0)
+
+    def _init_instruction_queue(self) -> None:
+        self.instruction_queue = deque(maxlen=int(self.speech_config.instruction_queue_length_seconds * self.byte_count_per_second))
+
+    def _init_capture(self) -> None:
+        capture_config = self.speech_config.capture_config
+        self.capture_format = probe_input_format(self.input_device_name, capture_config, self.sample_rate)
+        self._logger.info(f"Capturing audio from input device {self.input_device_name}: {self.capture_format}")
+        self._block_converter = BlockConverter(self.capture_format, self.sample_rate, self.bit_depth, capture_config.resampler_half_length)
+
+    def update_speech_config(self, speech_config: SpeechConfig) -> None:
+        """
+        Applies the given configuration right away if no buffer depends on the changed values. Otherwise, it is applied
+        as soon as no input stream is open, i.e. after the current keyword check or instruction, and only buffers
+        depending on changed values are rebuilt.
+        """
+        with self._pending_speech_config_lock:
+            if self._pending_speech_config is None and set(changed_fields(self.speech_config, speech_config)).isdisjoint(_BUFFER_SPEECH_FIELDS):
+                self.speech_config = speech_config
+                self._update_ambiance_time_constants()
+                return
+            self._pending_speech_config = speech_config
+
+    def _apply_pending_speech_config(self) -> None:
+        with self._pending_speech_config_lock:
+            speech_config, self._pending_speech_config = self._pending_speech_config, None
+        if speech_config is None:
+            return
+        changed = set(changed_fields(self.speech_config, speech_config))
+        self.speech_config = speech_config
+        if changed & _KEYWORD_WINDOW_SPEECH_FIELDS:
+            self._init_keyword_window()
+        if "instruction_queue_length_seconds" in changed:
+            self._init_instruction_queue()
+        if "capture_config" in changed:
+            self._init_capture()
+        self._update_ambiance_time_constants()
+        self._logger.info(f"Applied speech config: changed={sorted(changed)}")
+
+    def _update_ambiance_time_constants(self) -> None:
+        self.ambiance.rise_time_seconds = self.speech_config.ambiance_rise_time_seconds
+        self.ambiance.fall_time_seconds = self.speech_config.ambiance_fall_time_seconds
+
+    def update_keyword(self, keyword: List[str]) -> None:
+        """
+        Applies the given keyword from the next keyword check on.
+        """
+        self.keyword = KeyParagraphMapping(keyword, command=None)
 
     def start_listening(self, keyword: List[str], instruction_callback: Callable[[str], None]):
         """
@@ -60,58 +156,128 @@ class SpeechToTextListener:
         self._logger.info("Start recording using keyword '%s'", keyword)
 
         self.is_listening = True
-        keyword = KeyParagraphMapping(keyword, command=None)
+        self.update_keyword(keyword)
         while self.is_listening:
-            if self._wait_for_keyword(keyword):
+            self._apply_pending_speech_config()
+            keyword_transcription = self._wait_for_keyword()
+            if keyword_transcription is None:
+                continue
+            instruction = self.keyword.remainder(keyword_transcription).strip() if self.speech_config.single_pass_instruction else ""
+            if instruction != "":
+                self._logger.info("Extracted instruction following the keyword: %s", instruction)
+            else:
                 sound.play_ready(self.output_device_name)
                 instruction = self._record_instruction()
                 self._logger.info("Extracted instruction: %s", instruction)
-                self._clear_queues()
-                instruction_callback(instruction)
+            self._clear_queues()
+            instruction_callback(instruction)
 
 
     def stop_listening(self):
         self.is_listening = False
 
-    def _start_new_input_audio_stream(self,
-                                      callback: Callable[[np.ndarray, int, Any, sd.CallbackFlags], None]) -> sd.InputStream:
+    def _start_new_input_audio_stream(self, fill: Callable[[np.ndarray], None]) -> sd.InputStream:
+        """
+        :param fill: Called with each captured block converted to mono samples at the sample rate of the transcription engine.
+        """
+        self._block_converter.reset()
+
+        def callback(indata: np.ndarray, frames: int, t: Any, status: sd.CallbackFlags) -> None:
+            fill(self._block_converter.convert(indata))
+
+        capture_config = self.speech_config.capture_config
         try:
             return sd.InputStream(device=self.input_device_name,
-                                  channels=1, dtype=self.bit_depth.str, callback=callback, samplerate=self.sample_rate)
+                                  channels=self.capture_format.channels, dtype=self.capture_format.dtype,
+                                  samplerate=self.capture_format.sample_rate, blocksize=capture_config.block_size,
+                                  latency=capture_config.latency, callback=callback)
         except ValueError as e:
             raise IOError("Could not create input stream", e)
 
-    def _fill_keyword_queue(self, indata: np.ndarray, frames: int, t: Any, status: sd.CallbackFlags) -> None:
-        return self.keyword_queue.extend(indata[:, 0])
+    def _fill_keyword_window(self, block: np.ndarray) -> None:
+        self.ambiance.update(block)
+        self.keyword_window.write(block)
+        if self.black_box is not None:
+            self.black_box.write(block)
+            self._keyword_window_black_box_origin = self.black_box.sample_count - self.keyword_window.sample_count
 
-    def _fill_instruction_queue(self, indata: np.ndarray, frames: int, t: Any, status: sd.CallbackFlags) -> None:
-        return self.instruction_queue.extend(indata[:, 0])
+    def _fill_instruction_queue(self, block: np.ndarray) -> None:
+        self.ambiance.update(block)
+        self.instruction_queue.extend(block)
+        if self.black_box is not None:
+            self.black_box.write(block)
 
-    def _wait_for_keyword(self, keyword: KeyParagraphMapping) -> bool:
-        with self._start_new_input_audio_stream(self._fill_keyword_queue):
-            intermediate_decode: str = ""
-            while self.is_listening and (intermediate_decode == "" or not keyword.matches(intermediate_decode)):
+    def _wait_for_keyword(self) -> Optional[str]:
+        """
+        :return: The transcription containing the keyword or None if listening has been stopped or the speech config
+        has been updated.
+        """
+        with self._start_new_input_audio_stream(self._fill_keyword_window):
+            while self.is_listening and self._pending_speech_config is None:
                 sleep(self.speech_config.queue_check_interval_seconds)
-                intermediate_decode = ""
+                keyword_transcription = self._check_pending_keyword_windows(self.keyword)
+                if keyword_transcription is not None:
+                    return keyword_transcription
+        return None
+
+    def _check_pending_keyword_windows(self, keyword: KeyParagraphMapping) -> Optional[str]:
+        """
+        Evaluates all windows which have been completed since the last check, including the ones that passed by while
+        waiting for a transcription. Consecutive windows are one hop apart and share the bucket means of their overlap.
+        A relevant window is only transcribed if it does not overlap the previously transcribed window too much.
+        As the windows are cleared after each keyword hit, a hit is never found again in an overlapping window.
+        :return: The transcription of the first window in which the keyword has been found or None if there is no such
+        window.
+        """
+        window_length = self.speech_config.speech_bucket_count
+        while self.is_listening and self._next_keyword_window_end <= self.keyword_window.bucket_count:
+            window_end = self._next_keyword_window_end
+            window_start = window_end - window_length
+            if window_start < self.keyword_window.first_available_bucket:
+                # fell behind too far: continue with the oldest window still available
+                skipped_hops = math.ceil((self.keyword_window.first_available_bucket - window_start) / self.keyword_window_hop_buckets)
+                self._next_keyword_window_end += skipped_hops * self.keyword_window_hop_buckets
+                self._logger.debug("Skipped %s outdated keyword windows", skipped_hops)
+                continue
+            self._next_keyword_window_end += self.keyword_window_hop_buckets
+
+            is_relevant = _has_keyword_window_leading_silence_followed_by_speech_and_silence(
+                self.keyword_window.bucket_means(window_start, window_end),
+                self._compute_silence_threshold(self.speech_config.ambiance_level_factor),
+                self.speech_config.required_leading_silence_ratio,
+                self.speech_config.required_speech_ratio,
+                self.speech_config.required_trailing_silence_ratio)
+            if not is_relevant or not self._is_new_keyword_window(window_start, window_end):
+                continue
+
+            self._logger.debug("About to transcribe keyword window: buckets=[%s, %s), ambiance_level=%s", window_start, window_end, round(self.ambiance.floor))
+            self._last_transcribed_keyword_window = (window_start, window_end)
+            # a single pass instruction is taken from this transcription, so it is transcribed like an instruction
+            transcriber = self.instruction_transcriber if self.speech_config.single_pass_instruction else self.transcriber
+            transcription = self.call_for_transcription(self.keyword_window.samples(window_start, window_end), timeout_s=self.speech_config.transcription_timeout_seconds, transcriber=transcriber)
+            intermediate_decode = filter_non_alnum(transcription)
+            if intermediate_decode == "" or not keyword.matches(intermediate_decode):
                 self._logger.debug("Did not find keyword '%s' in '%s'", keyword, intermediate_decode)
-                is_relevant, queue_mean = _has_keyword_queue_leading_silence_followed_by_speech_and_silence(
-                    self.keyword_queue,
-                    self._compute_silence_threshold(self.speech_config.ambiance_level_factor),
-                    self.speech_config.speech_bucket_count,
-                    self.speech_config.required_leading_silence_ratio,
-                    self.speech_config.required_speech_ratio,
-                    self.speech_config.required_trailing_silence_ratio)
-                self.keyword_queue_bucket_means.append(queue_mean)
-                if is_relevant:
-                    self._logger.debug("About to transcribe keyword queue")
-                    transcription = self.call_for_transcription(self.keyword_queue, timeout_s=self.speech_config.transcription_timeout_seconds)
-                    intermediate_decode = filter_non_alnum(transcription)
-                    self._clear_queues()
-
-        if keyword.matches(intermediate_decode):
-            self._logger.info("Found keyword '%s' in '%s'", keyword, intermediate_decode)
-            return True
-        return False
+                self._record_keyword_window_event(window_start, window_end, intermediate_decode, "missed")
+            else:
+                self._logger.info("Found keyword '%s' in '%s'", keyword, intermediate_decode)
+                self._record_keyword_window_event(window_start, window_end, intermediate_decode, "found")
+                return intermediate_decode
+        return None
+
+    def _record_keyword_window_event(self, window_start: int, window_end: int, text: str, decision: str) -> None:
+        if self.black_box is None:
+            return
+        origin = self._keyword_window_black_box_origin
+        self.black_box.record_event("keyword_window",
+                                    origin + window_start * self.keyword_window_bucket_size,
+                                    origin + window_end * self.keyword_window_bucket_size,
+                                    text=text, decision=decision)
+
+    def _is_new_keyword_window(self, window_start: int, window_end: int) -> bool:
+        transcribed_start, transcribed_end = self._last_transcribed_keyword_window
+        overlap = max(0, min(window_end, transcribed_end) - max(window_start, transcribed_start))
+        return overlap <= self.speech_config.keyword_window_max_overlap_ratio * (window_end - window_start)
 
     def _record_instruction(self) -> str:
         with ((self._start_new_input_audio_stream(self._fill_instruction_queue))):
@@ -127,44 +293,65 @@ class SpeechToTextListener:
                    and (len(self.instruction_queue) < self.instruction_queue.maxlen)):
                 sleep(self.speech_config.queue_check_interval_seconds)
             self._logger.debug("About to transcribe instruction queue")
-            recorded_instruction: str = filter_non_alnum(self.call_for_transcription(self.instruction_queue, timeout_s=self.speech_config.transcription_timeout_seconds))
+            if self.black_box is not None:
+                # approximate, since the capture callback keeps appending to both
+                instruction_end = self.black_box.sample_count
+                instruction_start = instruction_end - len(self.instruction_queue)
+            recorded_instruction: str = filter_non_alnum(self.call_for_transcription(self.instruction_queue, timeout_s=self.speech_config.transcription_timeout_seconds, transcriber=self.instruction_transcriber, vocabulary=self.instruction_vocabulary))
             self._logger.debug("Recorded instruction: sample_count={}, text={}".format(len(self.instruction_queue), recorded_instruction))
+            if self.black_box is not None:
+                self.black_box.record_event("instruction", instruction_start, instruction_end, text=recorded_instruction)
             return recorded_instruction
 
     def _clear_queues(self) -> None:
-        self.keyword_queue.clear()
+        self.keyword_window.reset()
+        self._next_keyword_window_end = self.speech_config.speech_bucket_count
+        self._last_transcribed_keyword_window = (0, 0)
         self.instruction_queue.clear()
 
     def _compute_silence_threshold(self, ambiance_level_factor: float) -> int:
-        if len(self.keyword_queue) > 0 and len(self.keyword_queue_bucket_means) > 0:
-            ambiance_level_median = round(np.median(self.keyword_queue_bucket_means))
-        else:
-            ambiance_level_median = 0
-
-        factorized_threshold = round(ambiance_level_median * ambiance_level_factor)
+        ambiance_level = round(self.ambiance.floor)
+        factorized_threshold = round(ambiance_level * ambiance_level_factor)
         threshold = max(self.speech_config.min_silence_threshold, factorized_threshold)
-        self._logger.log(1, f"Compute silence threshold: ambiance_level_median * ambiance_level_factor = {ambiance_level_median} * {ambiance_level_factor} = {factorized_threshold} -> threshold {threshold}")
+        self._logger.log(1, f"Compute silence threshold: ambiance_level * ambiance_level_factor = {ambiance_level} * {ambiance_level_factor} = {factorized_threshold} -> threshold {threshold}")
         return threshold
 
-    def call_for_transcription(self, audio_data, timeout_s) -> str:
+    def call_for_transcription(self, audio_data, timeout_s,
+                               transcriber: Union["Transcriber", "BatchingTranscriber", "EscalatingTranscriber", RemoteTranscriber],
+                               vocabulary: Optional[VocabularyProvider] = None) -> str:
         self._logger.debug(f"Start transcribing with timeout {timeout_s}s")
         t_start = time.time()
-        future = self._EXECUTOR.submit(self.transcriber.transcribe, audio_data)
+        with self._pending_transcription_count_lock:
+            self.pending_transcription_count += 1
+        if vocabulary is None:
+            future = self._executor.submit(transcriber.transcribe, audio_data)
+        else:
+            future = self._executor.submit(transcriber.transcribe, audio_data, vocabulary)
+        future.add_done_callback(self._on_transcription_done)
         result = ""
+        timed_out = False
         try:
             result = future.result(timeout=timeout_s)
         except Exception as e:
+            timed_out = isinstance(e, FutureTimeoutError)
             self._logger.error(f"Could not transcribe audio: {type(e)} {str(e)}")
+        duration = time.time() - t_start
+        if self.on_transcription is not None:
+            self.on_transcription(duration, timed_out)
         if self._logger.isEnabledFor(14):
-            self._logger.log(14, f"Transcription ended with result '{result}' and took {round(time.time() - t_start, 6)}s")
+            self._logger.log(14, f"Transcription ended with result '{result}' and took {round(duration, 6)}s")
         return result
 
-def _has_keyword_queue_leading_silence_followed_by_speech_and_silence(data: Collection[int], silence_threshold: int, bucket_count: int,
-                                                                      required_leading_silence_ratio: float,
-                                                                      required_speech_ratio: float,
-                                                                      required_trailing_silence_ratio: float) -> (bool, int):
+    def _on_transcription_done(self, future: Future) -> None:
+        with self._pending_transcription_count_lock:
+            self.pending_transcription_count -= 1
+
+def _has_keyword_window_leading_silence_followed_by_speech_and_silence(bucket_means: np.ndarray, silence_threshold: int,
+                                                                       required_leading_silence_ratio: float,
+                                                                       required_speech_ratio: float,
+                                                                       required_trailing_silence_ratio: float) -> bool:
     """
-    Relevant means that at the start and end of the queue is silence and least an appropriate amount of buckets
+    Relevant means that at the start and end of the window is silence and least an appropriate amount of buckets
     possesses an average of absolute amplitude above the threshold.
 
 
@@ -178,21 +365,20 @@ def _has_keyword_queue_leading_silence_followed_by_speech_and_silence(data: Coll
                                  ##################  ################            #####
                 t -----|---------------------------------------------------------------------|---------->
                        ^                                                                     ^
-                       queue start                                                           queue end
-    :return tuple <is relevant>, <keyword queue abs mean>
+                       window start                                                          window end
+    :param bucket_means: The mean absolute amplitudes of the consecutive buckets making up the window.
     """
-    if len(data) < 1:
-        return False, 0
+    if len(bucket_means) < 1:
+        return False
     if (max(required_leading_silence_ratio, required_speech_ratio, required_trailing_silence_ratio) > 1
             or min(required_leading_silence_ratio, required_speech_ratio, required_trailing_silence_ratio) < 0
             or required_leading_silence_ratio + required_speech_ratio + required_trailing_silence_ratio > 1):
         raise ValueError("Ratios must be in interval [0, 1] and their sum must be less than 1: " + str([required_leading_silence_ratio, required_speech_ratio, required_trailing_silence_ratio]))
 
-    arr = np.abs(np.array(data))
-    interval_length = math.floor(len(arr) / bucket_count)
+    bucket_count = len(bucket_means)
 
     if LOGGER.isEnabledFor(1):
-        LOGGER.log(1, "\n" + _queue_to_str(arr, bucket_count, silence_threshold))
+        LOGGER.log(1, "\n" + _bucket_means_to_str(bucket_means, silence_threshold))
 
     required_leading_silence_buckets: int = round(bucket_count * required_leading_silence_ratio)
     required_buckets_with_speech: int = round(bucket_count * required_speech_ratio)
@@ -201,31 +387,26 @@ def _has_keyword_queue_leading_silence_followed_by_speech_and_silence(data: Coll
     trailing_silence_length = -1
     buckets_with_speech = 0
     last_silent_bucket = 0
-    for i in range(0, bucket_count):
-        lower = i * interval_length
-        upper = (i + 1) * interval_length
-        if upper > len(arr):
-            break
-        bucket_mean = arr[lower: upper].mean()
+    for i, bucket_mean in enumerate(bucket_means):
         if bucket_mean >= silence_threshold:
             last_bucket_with_speech = i
             buckets_with_speech += 1
         else:
             last_silent_bucket = i
         if last_bucket_with_speech is not None and last_bucket_with_speech < required_leading_silence_buckets:
-            LOGGER.log(1, "Keyword queue is NOT relevant: Too few leading silent buckets: current_bucket=%s, last_bucket_with_speech=%i, min_required_leading_silent_buckets=%i",
+            LOGGER.log(1, "Keyword window is NOT relevant: Too few leading silent buckets: current_bucket=%s, last_bucket_with_speech=%i, min_required_leading_silent_buckets=%i",
                          i, last_bucket_with_speech, required_leading_silence_buckets)
-            return False, arr.mean()
+            return False
         if last_bucket_with_speech is not None and buckets_with_speech >= required_buckets_with_speech:
             # here if there is enough speech
             trailing_silence_length = last_silent_bucket - last_bucket_with_speech # may be negative
             if trailing_silence_length >= required_trailing_silence_buckets:
-                LOGGER.log(1, "Keyword queue is relevant: current_bucket=%s, last_bucket_with_speech=%s, buckets_with_speech=%s, required_buckets_with_speech=%s, last_silent_bucket=%s, trailing_silence_length=%s, required_trailing_silence_buckets=%s",
+                LOGGER.log(1, "Keyword window is relevant: current_bucket=%s, last_bucket_with_speech=%s, buckets_with_speech=%s, required_buckets_with_speech=%s, last_silent_bucket=%s, trailing_silence_length=%s, required_trailing_silence_buckets=%s",
                     i, last_bucket_with_speech, buckets_with_speech, buckets_with_speech, last_silent_bucket, trailing_silence_length, required_trailing_silence_buckets)
-                return True, arr.mean()
-    LOGGER.log(1, "Keyword queue is NOT relevant: Could not find silence after speech: last_bucket_with_speech=%s, buckets_with_speech=%s, required_buckets_with_speech=%s, last_silent_bucket=%s, trailing_silence_length=%s, required_trailing_silence_buckets=%s",
+                return True
+    LOGGER.log(1, "Keyword window is NOT relevant: Could not find silence after speech: last_bucket_with_speech=%s, buckets_with_speech=%s, required_buckets_with_speech=%s, last_silent_bucket=%s, trailing_silence_length=%s, required_trailing_silence_buckets=%s",
                  last_bucket_with_speech, buckets_with_speech, required_buckets_with_speech, last_silent_bucket, trailing_silence_length, required_trailing_silence_buckets)
-    return False, arr.mean()
+    return False
 
 
 def _has_instruction_queue_speech_followed_by_silence(data: Collection[int],
@@ -294,23 +475,23 @@ def _has_instruction_queue_speech_followed_by_silence(data: Collection[int],
 def _queue_to_str(data: Collection, bucket_count: int, silence_threshold: int, bucket_str_length: int = 4) -> str:
     interval_length = math.floor(len(data) / bucket_count)
     arr = np.abs(data)
+    bucket_means = [arr[i * interval_length: (i + 1) * interval_length].mean() for i in range(bucket_count) if (i + 1) * interval_length <= len(arr)]
+    return _bucket_means_to_str(np.array(bucket_means), silence_threshold, bucket_str_length)
 
+
+def _bucket_means_to_str(bucket_means: np.ndarray, silence_threshold: int, bucket_str_length: int = 4) -> str:
     index_line = "index |".rjust(12)
     threshold_broken_line = "threshold |".rjust(12)
     mean_line = "mean |".rjust(12)
     threshold_line = f"threshold: {silence_threshold}"
-    stats_line = "percentiles [10%, 50%, 75%, 90%]: " + str(np.round(np.percentile(arr, q=[10, 50, 75, 90])))
+    stats_line = "bucket mean percentiles [10%, 50%, 75%, 90%]: " + str(np.round(np.percentile(bucket_means, q=[10, 50, 75, 90])))
 
     maximum_mean_value_to_display = 10 ** (bucket_str_length - 1) - 1
     threshold_break_str = "#" * bucket_str_length
     threshold_not_broken_str = " " * bucket_str_length
 
-    for i in range(bucket_count):
-        lower = i * interval_length
-        upper = (i + 1) * interval_length
-        if upper > len(arr):
-            break
-        mean = round(arr[lower: upper].mean())
+    for i, bucket_mean in enumerate(bucket_means):
+        mean = round(bucket_mean)
         index_line += "{}|".format(str(i).center(bucket_str_length, "-"))
         threshold_broken_line += "{}|".format(threshold_break_str if mean > silence_threshold else threshold_not_broken_str)
         mean_line += "{}|".format(str(min(mean, maximum_mean_value_to_display)).center(bucket_str_length))
@@ -322,4 +503,3 @@ def _queue_to_str(data: Collection, bucket_count: int, silence_threshold: int, b
     {threshold_line}
     {stats_line}
     """
-
@@ -1,30 +1,507 @@
+import math
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from queue import Queue, Empty
+from threading import Thread, Lock
+from typing import List, Tuple, Any, Optional, Union, Dict
+from weakref import WeakKeyDictionary
+
 import numpy as np
+import torch
 import whisper
+from whisper.decoding import DecodingTask, DecodingResult, LogitFilter
+from whisper.tokenizer import Tokenizer, get_tokenizer
+
+from src import log
+from src.config import DecodingConfig, LurkerConfig
+from src.utils import TokenTrie, VocabularyProvider
+
+
+_FALLBACK_TEMPERATURES = (0.2, 0.4, 0.6, 0.8, 1.0)
+# thresholds as used by whisper.transcribe
+_COMPRESSION_RATIO_THRESHOLD = 2.4
+_LOGPROB_THRESHOLD = -1.
+_NO_SPEECH_THRESHOLD = 0.6
+
+_MODEL_LOCKS: "WeakKeyDictionary[whisper.Whisper, Lock]" = WeakKeyDictionary()
+_MODEL_LOCKS_LOCK = Lock()
+
+
+def _model_lock(model: whisper.Whisper) -> Lock:
+    """
+    :return: The lock serializing access to the given model, shared by all transcribers using the same instance.
+    Decoding installs key-value cache hooks on the modules of the model, such that concurrent decoding passes on one
+    instance corrupt each other's results.
+    """
+    with _MODEL_LOCKS_LOCK:
+        lock = _MODEL_LOCKS.get(model, None)
+        if lock is None:
+            lock = Lock()
+            _MODEL_LOCKS[model] = lock
+        return lock
+
+
+@dataclass(frozen=True)
+class TranscriptionResult:
+    text: str
+    avg_logprob: float
+    """The average log-probability of the decoded tokens according to the model, i.e. unaffected by vocabulary steering."""
+    decode_count: int
+    """The number of decoding passes including temperature fallbacks."""
+    hit_token_limit: bool
+    """True iff decoding stopped because the maximum number of tokens had been reached."""
+    hit_time_budget: bool
+    """True iff decoding stopped because the wall-clock budget had been exhausted."""
+
+
+class _TimeBudgetFilter(LogitFilter):
+    """
+    Forces the end-of-text token once the deadline has passed. As logit filters are applied in every decoder step,
+    decoding ends at the first step after the deadline.
+    """
+
+    def __init__(self, deadline: float, eot: int):
+        self.deadline = deadline
+        self.eot = eot
+        self.hit = False
+
+    def apply(self, logits: torch.Tensor, tokens: torch.Tensor) -> None:
+        if time.monotonic() > self.deadline:
+            self.hit = True
+            logits[:, :] = -np.inf
+            logits[:, self.eot] = 0
+
+
+class _UnfilteredLogprobFilter(LogitFilter):
+    """
+    Records the log-probabilities of the decoded tokens according to the logits of the model, as whisper computes the
+    reported log-probabilities after all logit filters have been applied. Must precede all other logit filters.
+    Sequences are identified by their tokens, since beam search reorders the rows between decoder steps.
+    """
+
+    def __init__(self, sample_begin: int, eot: int, n_audio: int):
+        self.sample_begin = sample_begin
+        self.eot = eot
+        self.n_audio = n_audio
+        self._sums: Dict[Tuple[int, Tuple[int, ...]], float] = {}
+        self._eot_sums: Dict[Tuple[int, Tuple[int, ...]], float] = {}
+        self._previous_rows: Dict[Tuple[int, Tuple[int, ...]], int] = {}
+        self._previous_logprobs: Optional[torch.Tensor] = None
+
+    def apply(self, logits: torch.Tensor, tokens: torch.Tensor) -> None:
+        logprobs = torch.log_softmax(logits.float(), dim=-1)
+        eot_logprobs = logprobs[:, self.eot].tolist()
+        group_size = tokens.shape[0] // self.n_audio
+        rows = {}
+        for row, row_tokens in enumerate(tokens[:, self.sample_begin:].tolist()):
+            key = (row // group_size, tuple(row_tokens))
+            if key not in self._sums:
+                self._sums[key] = 0. if len(row_tokens) == 0 else self._extended_sum(key)
+            self._eot_sums[key] = self._sums[key] + eot_logprobs[row]
+            rows[key] = row
+        self._previous_rows = rows
+        self._previous_logprobs = logprobs
+
+    def _extended_sum(self, key: Tuple[int, Tuple[int, ...]]) -> float:
+        """
+        :return: The sum of log-probabilities of a sequence continuing a sequence of the previous decoder step by one token.
+        """
+        audio_index, sequence = key
+        parent = (audio_index, sequence[:-1])
+        return self._sums[parent] + self._previous_logprobs[self._previous_rows[parent], sequence[-1]].item()
+
+    def avg_logprob(self, audio_index: int, tokens: List[int]) -> float:
+        """
+        :return: The average log-probability of the given decoded tokens and the end-of-text token, computed like the
+        average log-probability reported by whisper.
+        """
+        key = (audio_index, tuple(tokens))
+        # a sequence ending at the token limit has neither been extended by the end-of-text token nor passed to the filter
+        total = self._eot_sums[key] if key in self._eot_sums else self._extended_sum(key)
+        return total / (len(tokens) + 1)
+
+
+class _VocabularyFilter(LogitFilter):
+    """
+    Steers decoding towards the token sequences of a vocabulary. If a bias is given, the logits of all tokens starting
+    or continuing a vocabulary sequence are raised by it. Otherwise, only tokens continuing a sequence from the start
+    of the decoded text are allowed and the end-of-text token is only allowed once a complete sequence has been decoded.
+    """
+
+    def __init__(self, trie: TokenTrie, sample_begin: int, eot: int, bias: Optional[float]):
+        self.trie = trie
+        self.sample_begin = sample_begin
+        self.eot = eot
+        self.bias = bias
+
+    def apply(self, logits: torch.Tensor, tokens: torch.Tensor) -> None:
+        for row, row_tokens in enumerate(tokens[:, self.sample_begin:].tolist()):
+            if self.bias is not None:
+                boosted = {token for node in self.trie.active_nodes(row_tokens) for token in node.children.keys()}
+                if len(boosted) > 0:
+                    logits[row, list(boosted)] += self.bias
+                continue
+            node = self.trie.walk(row_tokens)
+            allowed = [] if node is None else list(node.children.keys())
+            if node is None or node.is_terminal:
+                allowed.append(self.eot)
+            mask = torch.full_like(logits[row], -np.inf)
+            mask[allowed] = 0
+            logits[row] += mask
+
+
+class PhraseTokenizer:
+    """
+    Maps lower case phrases to the token sequences a model may produce for them. There is one instance per whisper
+    tokenizer, which is shared by all transcribers using that tokenizer, such that vocabularies cached per phrase
+    tokenizer neither grow with rebuilt transcribers nor keep their models alive.
+    """
+
+    def __init__(self, tokenizer: Tokenizer):
+        self.tokenizer = tokenizer
+
+    def __call__(self, phrase: str) -> List[List[int]]:
+        """
+        :return: The token sequences for the given phrase with and without a capitalized first letter and both with a
+        leading space.
+        """
+        variants = {" " + phrase, " " + phrase[:1].upper() + phrase[1:]}
+        return [self.tokenizer.encode(variant) for variant in variants]
+
+
+_PHRASE_TOKENIZERS: Dict[int, PhraseTokenizer] = {}  # id of the whisper tokenizer -> phrase tokenizer
+_PHRASE_TOKENIZERS_LOCK = Lock()
+
+
+def _phrase_tokenizer(tokenizer: Tokenizer) -> PhraseTokenizer:
+    # whisper caches its tokenizers, so their ids remain valid
+    with _PHRASE_TOKENIZERS_LOCK:
+        phrase_tokenizer = _PHRASE_TOKENIZERS.get(id(tokenizer), None)
+        if phrase_tokenizer is None:
+            phrase_tokenizer = PhraseTokenizer(tokenizer)
+            _PHRASE_TOKENIZERS[id(tokenizer)] = phrase_tokenizer
+        return phrase_tokenizer
+
 
 class Transcriber:
     """
     Abstraction of actual transcription engine in use.
     """
 
-    def __init__(self, model_path: str, spoken_language: str):
-        self.model: whisper.Whisper = whisper.load_model(model_path, in_memory=True)
+    def __init__(self, model_path: str, spoken_language: str, decoding_config: DecodingConfig = DecodingConfig(),
+                 model: Optional[whisper.Whisper] = None):
+        """
+        :param model: An instance of the model at model_path loaded before. If not given, the model is loaded.
+        """
+        self._logger = log.new_logger(self.__class__.__name__)
+        self.model_path = model_path
+        self.model: whisper.Whisper = whisper.load_model(model_path, in_memory=True) if model is None else model
+        self._model_lock = _model_lock(self.model)
         self.spoken_language = spoken_language
+        self.decoding_config = decoding_config
+        self.tokenizer = get_tokenizer(self.model.is_multilingual, num_languages=self.model.num_languages,
+                                       language=self.spoken_language, task="transcribe")
+        self.tokenize_phrase = _phrase_tokenizer(self.tokenizer)
+        """Tokenizes the phrases of vocabularies."""
         self.sample_rate = 16_000
         self.bit_depth = np.dtype(np.int16)
 
-    def transcribe(self, data) -> str:
-        """
-        Taken from https://github.com/davabase/whisper_real_time/blob/master/transcribe_demo.py
-        """
+    def _to_audio(self, data) -> np.ndarray:
         #   Convert in-ram buffer to something the model can use directly without needing a temp file.
         #   Convert data from 16 bit wide integers to floating point with a width of 32 bits.
         #   Clamp the audio stream frequency to a PCM wavelength compatible default of 32768hz max.
-        audio = np.array(data, dtype=self.bit_depth).astype(np.float32) / 32768.
-        result = self.model.transcribe(whisper.pad_or_trim(audio),
-                                       condition_on_previous_text=False,
-                                       without_timestamps=True,
-                                       word_timestamps=False,
-                                       fp16=False,
-                                       language=self.spoken_language
-                                       )
-        return result["text"].strip().lower()
\ No newline at end of file
+        return np.array(data, dtype=self.bit_depth).astype(np.float32) / 32768.
+
+    def loaded_models(self) -> Dict[str, whisper.Whisper]:
+        """
+        :return: The loaded model instances by their model path.
+        """
+        return {self.model_path: self.model}
+
+    def phrase_tokenizers(self) -> List[PhraseTokenizer]:
+        return [self.tokenize_phrase]
+
+    def update_decoding_config(self, decoding_config: DecodingConfig) -> None:
+        """
+        Applies the given decoding config from the next transcription on.
+        """
+        with self._model_lock:
+            self.decoding_config = decoding_config
+
+    def transcribe(self, data, vocabulary: Optional[VocabularyProvider] = None) -> str:
+        return self.transcribe_with_details(data, vocabulary).text
+
+    def transcribe_with_details(self, data, vocabulary: Optional[VocabularyProvider] = None) -> TranscriptionResult:
+        return self.transcribe_batch_with_details([data], vocabulary)[0]
+
+    def transcribe_batch(self, data_batch: List) -> List[str]:
+        return [result.text for result in self.transcribe_batch_with_details(data_batch)]
+
+    def transcribe_batch_with_details(self, data_batch: List, vocabulary: Optional[VocabularyProvider] = None) -> List[TranscriptionResult]:
+        """
+        Transcribes several audio snippets at once such that the encoder runs a single forward pass over all of them.
+        Decoding is bounded according to the decoding config: The number of tokens is limited relative to the duration
+        of the longest snippet and all decoding passes of one call share a wall-clock budget. Snippets with a
+        suspicious result are decoded again with increasing temperatures only if temperature fallback is enabled.
+        :param vocabulary: If given, decoding is biased towards or constrained to the vocabulary according to the
+        decoding config. Constrained results with a low log-probability are decoded again without constraints.
+        Calls are serialized with all other calls on the same model instance, e.g. by other listeners or transcribers.
+        """
+        with self._model_lock:
+            return self._transcribe_batch_with_details(data_batch, vocabulary)
+
+    def _transcribe_batch_with_details(self, data_batch: List, vocabulary: Optional[VocabularyProvider]) -> List[TranscriptionResult]:
+        t_start = time.monotonic()
+        budget = self.decoding_config.time_budget_seconds
+        deadline = np.inf if budget is None else t_start + budget
+
+        audios = [self._to_audio(data) for data in data_batch]
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), n_mels=self.model.dims.n_mels) for audio in audios
+        ]).to(self.model.device)
+        max_duration_s = max(len(audio) for audio in audios) / self.sample_rate
+        token_limit = min(self.model.dims.n_text_ctx // 2,
+                          max(self.decoding_config.min_token_limit, math.ceil(max_duration_s * self.decoding_config.token_limit_per_second)))
+
+        vocabulary_mode = self.decoding_config.vocabulary_mode
+        trie = vocabulary(self.tokenize_phrase) if vocabulary is not None and vocabulary_mode != "off" else None
+        if trie is not None and trie.size < 1:
+            trie = None
+
+        decoded, avg_logprobs, hit_time_budget = self._decode(mel, temperature=0., token_limit=token_limit, deadline=deadline, trie=trie)
+        results = [self._to_result(d, avg_logprob, 1, token_limit, hit_time_budget) for d, avg_logprob in zip(decoded, avg_logprobs)]
+        for i, (d, avg_logprob) in enumerate(zip(decoded, avg_logprobs)):
+            decode_count = 1
+            if trie is not None and vocabulary_mode == "constrain" and avg_logprob < _LOGPROB_THRESHOLD and time.monotonic() <= deadline:
+                # the snippet does not seem to contain a phrase of the vocabulary, e.g. it matches a regex key instead
+                self._logger.debug(f"Constrained decoding is unlikely: text={d.text}, avg_logprob={round(avg_logprob, 3)} - Decoding freely")
+                d, avg_logprob, hit_time_budget = self._decode_single(mel[i:i + 1], temperature=0., token_limit=token_limit, deadline=deadline)
+                decode_count += 1
+                results[i] = self._to_result(d, avg_logprob, decode_count, token_limit, hit_time_budget)
+            if not self.decoding_config.temperature_fallback:
+                continue
+            for temperature in _FALLBACK_TEMPERATURES:
+                if not _needs_fallback(d, avg_logprob) or time.monotonic() > deadline:
+                    break
+                d, avg_logprob, hit_time_budget = self._decode_single(mel[i:i + 1], temperature=temperature, token_limit=token_limit, deadline=deadline)
+                decode_count += 1
+                results[i] = self._to_result(d, avg_logprob, decode_count, token_limit, hit_time_budget)
+
+        if self._logger.isEnabledFor(14):
+            for result in results:
+                if result.hit_token_limit or result.hit_time_budget or result.decode_count > 1:
+                    self._logger.log(14, f"Decoding hit limits: token_limit={token_limit}, hit_token_limit={result.hit_token_limit}, "
+                                         f"time_budget_seconds={budget}, hit_time_budget={result.hit_time_budget}, decode_count={result.decode_count}")
+        return results
+
+    def _decode(self, mel: torch.Tensor, temperature: float, token_limit: int, deadline: float,
+                trie: Optional[TokenTrie] = None) -> Tuple[List[DecodingResult], List[float], bool]:
+        """
+        :return: The decoding results, their average log-probabilities according to the model and whether the time
+        budget has been exhausted.
+        """
+        options = whisper.DecodingOptions(
+            language=self.spoken_language,
+            temperature=temperature,
+            sample_len=token_limit,
+            beam_size=self.decoding_config.beam_size if temperature == 0 and not self.decoding_config.greedy else None,
+            without_timestamps=True,
+            fp16=False
+        )
+        task = DecodingTask(self.model, options)
+        logprob_filter = None
+        if trie is not None:
+            # the log-probabilities reported for decoding steered by the vocabulary are inflated by the vocabulary filter
+            logprob_filter = _UnfilteredLogprobFilter(task.sample_begin, task.tokenizer.eot, mel.shape[0])
+            task.logit_filters.insert(0, logprob_filter)
+            bias = self.decoding_config.vocabulary_bias if self.decoding_config.vocabulary_mode == "bias" else None
+            task.logit_filters.append(_VocabularyFilter(trie, task.sample_begin, task.tokenizer.eot, bias))
+        time_budget_filter = _TimeBudgetFilter(deadline, task.tokenizer.eot)
+        task.logit_filters.append(time_budget_filter)
+        decoded = task.run(mel)
+        avg_logprobs = [d.avg_logprob if logprob_filter is None else logprob_filter.avg_logprob(i, d.tokens) for i, d in enumerate(decoded)]
+        return decoded, avg_logprobs, time_budget_filter.hit
+
+    def _decode_single(self, mel: torch.Tensor, temperature: float, token_limit: int, deadline: float) -> Tuple[DecodingResult, float, bool]:
+        decoded, avg_logprobs, hit_time_budget = self._decode(mel, temperature, token_limit, deadline)
+        return decoded[0], avg_logprobs[0], hit_time_budget
+
+    @staticmethod
+    def _to_result(decoded: DecodingResult, avg_logprob: float, decode_count: int, token_limit: int, hit_time_budget: bool) -> TranscriptionResult:
+        is_silent = decoded.no_speech_prob > _NO_SPEECH_THRESHOLD and avg_logprob < _LOGPROB_THRESHOLD
+        return TranscriptionResult(
+            text="" if is_silent else decoded.text.strip().lower(),
+            avg_logprob=avg_logprob,
+            decode_count=decode_count,
+            hit_token_limit=len(decoded.tokens) >= token_limit,
+            hit_time_budget=hit_time_budget
+        )
+
+
+def _needs_fallback(decoded: DecodingResult, avg_logprob: float) -> bool:
+    if decoded.no_speech_prob > _NO_SPEECH_THRESHOLD and avg_logprob < _LOGPROB_THRESHOLD:
+        # silence: a different temperature will not help
+        return False
+    return decoded.compression_ratio > _COMPRESSION_RATIO_THRESHOLD or avg_logprob < _LOGPROB_THRESHOLD
+
+
+class BatchingTranscriber:
+    """
+    Collects transcription requests issued concurrently by several listeners and passes them to a shared transcriber
+    in batches.
+    """
+
+    def __init__(self, transcriber: Transcriber, max_batch_size: int, batch_window_seconds: float):
+        self._logger = log.new_logger(self.__class__.__name__)
+        self.transcriber = transcriber
+        self.max_batch_size = max_batch_size
+        self.batch_window_seconds = batch_window_seconds
+        self._requests: Queue[Optional[Tuple[Any, Future]]] = Queue()
+        Thread(target=self._process_batches, name="lurker_transcription_batcher", daemon=True).start()
+
+    def transcribe(self, data) -> str:
+        """
+        Blocks until the batch containing the given data has been transcribed.
+        """
+        future = Future()
+        self._requests.put((data, future))
+        return future.result()
+
+    def close(self) -> None:
+        """
+        Stops batching once all pending requests have been transcribed.
+        """
+        self._requests.put(None)
+
+    def _collect_batch(self) -> Tuple[List[Tuple[Any, Future]], bool]:
+        """
+        :return: The batch and whether the batcher has been closed.
+        """
+        request = self._requests.get()
+        if request is None:
+            return [], True
+        batch = [request]
+        deadline = time.monotonic() + self.batch_window_seconds
+        while len(batch) < self.max_batch_size:
+            try:
+                request = self._requests.get(timeout=max(0., deadline - time.monotonic()))
+            except Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _process_batches(self) -> None:
+        is_closed = False
+        while not is_closed:
+            batch, is_closed = self._collect_batch()
+            if len(batch) == 0:
+                continue
+            self._logger.debug(f"Transcribing batch: size={len(batch)}")
+            try:
+                texts = self.transcriber.transcribe_batch([data for data, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text)
+
+
+class EscalatingTranscriber:
+    """
+    Transcribes instructions with a larger model than the one used for keyword checks.
+    If a minimum average log-probability is given, the smaller model transcribes first and only results below that
+    threshold are escalated to the larger model.
+    """
+
+    def __init__(self,
+                 transcriber: Transcriber,
+                 escalation_model_path: str,
+                 spoken_language: str,
+                 min_avg_logprob: Optional[float],
+                 lazy: bool,
+                 decoding_config: DecodingConfig = DecodingConfig(),
+                 loaded_models: Optional[Dict[str, whisper.Whisper]] = None):
+        """
+        :param lazy: If true, the larger model is loaded on first use instead of right away.
+        :param loaded_models: Model instances by their model path to use instead of loading the larger model again.
+        """
+        self._logger = log.new_logger(self.__class__.__name__)
+        self.transcriber = transcriber
+        self.escalation_model_path = escalation_model_path
+        self.spoken_language = spoken_language
+        self.min_avg_logprob = min_avg_logprob
+        self.decoding_config = decoding_config
+        self._loaded_models = {} if loaded_models is None else loaded_models
+        self._escalation_transcriber: Optional[Transcriber] = None
+        self._lock = Lock()
+        if not lazy:
+            self._get_escalation_transcriber()
+
+    def _get_escalation_transcriber(self) -> Transcriber:
+        with self._lock:
+            if self._escalation_transcriber is None:
+                # an instance shared with the smaller transcriber is serialized by the lock of the model
+                model = (self.transcriber.loaded_models() | self._loaded_models).get(self.escalation_model_path, None)
+                if model is None:
+                    self._logger.info(f"Loading instruction model {self.escalation_model_path}")
+                self._escalation_transcriber = Transcriber(model_path=self.escalation_model_path, spoken_language=self.spoken_language,
+                                                           decoding_config=self.decoding_config, model=model)
+            return self._escalation_transcriber
+
+    def loaded_models(self) -> Dict[str, whisper.Whisper]:
+        with self._lock:
+            escalation_models = {} if self._escalation_transcriber is None else self._escalation_transcriber.loaded_models()
+        return self.transcriber.loaded_models() | escalation_models
+
+    def phrase_tokenizers(self) -> List[PhraseTokenizer]:
+        with self._lock:
+            escalation_tokenizers = [] if self._escalation_transcriber is None else self._escalation_transcriber.phrase_tokenizers()
+        return self.transcriber.phrase_tokenizers() + escalation_tokenizers
+
+    def update_decoding_config(self, decoding_config: DecodingConfig) -> None:
+        self.transcriber.update_decoding_config(decoding_config)
+        with self._lock:
+            self.decoding_config = decoding_config
+            escalation_transcriber = self._escalation_transcriber
+        if escalation_transcriber is not None:
+            escalation_transcriber.update_decoding_config(decoding_config)
+
+    def transcribe(self, data, vocabulary: Optional[VocabularyProvider] = None) -> str:
+        if self.min_avg_logprob is None:
+            return self._get_escalation_transcriber().transcribe(data, vocabulary)
+        result = self.transcriber.transcribe_with_details(data, vocabulary)
+        if result.avg_logprob >= self.min_avg_logprob:
+            return result.text
+        self._logger.info(f"Escalating transcription to instruction model: text={result.text}, avg_logprob={round(result.avg_logprob, 3)}, min_avg_logprob={self.min_avg_logprob}")
+        return self._get_escalation_transcriber().transcribe(data, vocabulary)
+
+
+def create_transcribers(lurker_config: LurkerConfig, loaded_models: Optional[Dict[str, whisper.Whisper]] = None) -> Tuple[Transcriber, Union[Transcriber, EscalatingTranscriber]]:
+    """
+    :param loaded_models: Model instances by their model path to use instead of loading them again.
+    :return: The transcriber for keyword windows and the one for instructions according to the given configuration.
+    """
+    loaded_models = {} if loaded_models is None else loaded_models
+    transcriber = Transcriber(
+        model_path=lurker_config.LURKER_MODEL,
+        spoken_language=lurker_config.LURKER_LANGUAGE,
+        decoding_config=lurker_config.LURKER_SPEECH_CONFIG.decoding_config,
+        model=loaded_models.get(lurker_config.LURKER_MODEL, None)
+    )
+    instruction_transcriber = transcriber
+    if lurker_config.LURKER_INSTRUCTION_MODEL is not None:
+        min_logprob = lurker_config.LURKER_INSTRUCTION_MODEL_MIN_LOGPROB
+        instruction_transcriber = EscalatingTranscriber(
+            transcriber,
+            escalation_model_path=lurker_config.LURKER_INSTRUCTION_MODEL,
+            spoken_language=lurker_config.LURKER_LANGUAGE,
+            min_avg_logprob=None if min_logprob is None else float(min_logprob),
+            lazy=str(lurker_config.LURKER_INSTRUCTION_MODEL_LAZY).lower() == "true",
+            decoding_config=lurker_config.LURKER_SPEECH_CONFIG.decoding_config,
+            loaded_models=loaded_models
+        )
+    return transcriber, instruction_transcriber
@@ -0,0 +1,184 @@
+"""
+Hosts the transcription models for lurker nodes configured with LURKER_TRANSCRIPTION_SERVER, see
+src.remote_transcription for the protocol. Models and decoding are configured by the config.json of the given lurker
+home like for a local lurker.
+
+Run from the repository root, for example:
+    python -m src.transcription_server --lurker-home lurker --address 0.0.0.0:8765
+"""
+import argparse
+import os
+import socket
+import socketserver
+from threading import Thread, Lock
+from typing import Optional, List, Dict, Tuple, Callable, Iterable, Sequence, Union, Set
+
+from src import log
+from src.config import load_lurker_config
+from src.remote_transcription import parse_address, receive_request, encode_response, ProtocolError, STATUS_OK, STATUS_ERROR
+from src.transcription import Transcriber, EscalatingTranscriber, BatchingTranscriber, create_transcribers
+from src.utils import TokenTrie
+
+LOGGER = log.new_logger(__name__)
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class _PhraseVocabulary:
+    """
+    Vocabulary provider over the phrases sent along with a request.
+    """
+
+    def __init__(self, phrases: List[str]):
+        self.phrases = phrases
+        self._tries: Dict[Callable, TokenTrie] = {}
+        self._lock = Lock()
+
+    def __call__(self, tokenize: Callable[[str], Iterable[Sequence[int]]]) -> TokenTrie:
+        with self._lock:
+            trie = self._tries.get(tokenize, None)
+            if trie is None:
+                trie = TokenTrie(sequence for phrase in self.phrases for sequence in tokenize(phrase))
+                self._tries[tokenize] = trie
+            return trie
+
+
+class TranscriptionServer:
+    """
+    Transcribes audio sent by lurker nodes. Keyword windows arriving concurrently are transcribed in batches.
+    """
+
+    def __init__(self,
+                 address: str,
+                 transcriber: Transcriber,
+                 instruction_transcriber: Union[Transcriber, EscalatingTranscriber],
+                 max_batch_size: int,
+                 batch_window_seconds: float,
+                 max_vocabulary_count: int = 16):
+        """
+        :param max_vocabulary_count: Number of distinct vocabularies whose token tries are kept, e.g. one per set of
+        actions of the connected nodes.
+        """
+        self._logger = log.new_logger(self.__class__.__name__)
+        self.address = address
+        self.transcriber = transcriber
+        self.instruction_transcriber = instruction_transcriber
+        self.batching_transcriber = BatchingTranscriber(transcriber, max_batch_size=max_batch_size, batch_window_seconds=batch_window_seconds)
+        self.max_vocabulary_count = max_vocabulary_count
+        self._vocabularies: Dict[Tuple[str, ...], _PhraseVocabulary] = {}
+        self._vocabularies_lock = Lock()
+        self._connections: Set[socket.socket] = set()
+        self._connections_lock = Lock()
+
+        family, socket_address = parse_address(address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(socket_address):
+                # left over by a previous server
+                os.remove(socket_address)
+            self._server = _UnixServer(socket_address, self._create_request_handler_type())
+        else:
+            self._server = _TCPServer(socket_address, self._create_request_handler_type())
+
+    def serve_forever(self) -> None:
+        self._logger.info(f"Serving transcriptions at {self.address}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def start(self) -> "TranscriptionServer":
+        Thread(target=self.serve_forever, name="lurker_transcription_server", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self.batching_transcriber.close()
+        with self._connections_lock:
+            for connection in self._connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def transcribe(self, samples, phrases: Optional[List[str]], is_instruction: bool) -> str:
+        vocabulary = None if phrases is None else self._get_vocabulary(phrases)
+        if is_instruction:
+            return self.instruction_transcriber.transcribe(samples, vocabulary)
+        if vocabulary is not None:
+            return self.transcriber.transcribe(samples, vocabulary)
+        return self.batching_transcriber.transcribe(samples)
+
+    def _get_vocabulary(self, phrases: List[str]) -> _PhraseVocabulary:
+        key = tuple(phrases)
+        with self._vocabularies_lock:
+            vocabulary = self._vocabularies.get(key, None)
+            if vocabulary is None:
+                if len(self._vocabularies) >= self.max_vocabulary_count:
+                    self._vocabularies.clear()
+                vocabulary = _PhraseVocabulary(phrases)
+                self._vocabularies[key] = vocabulary
+            return vocabulary
+
+    def _create_request_handler_type(self) -> type:
+        server = self
+
+        class _RequestHandler(socketserver.BaseRequestHandler):
+
+            def setup(self) -> None:
+                with server._connections_lock:
+                    server._connections.add(self.request)
+
+            def finish(self) -> None:
+                with server._connections_lock:
+                    server._connections.discard(self.request)
+
+            def handle(self) -> None:
+                server._logger.debug(f"Accepted connection: client={self.client_address}")
+                while True:
+                    try:
+                        samples, phrases, is_instruction = receive_request(self.request)
+                    except (ProtocolError, OSError) as e:
+                        server._logger.debug(f"Closing connection: client={self.client_address}, reason={e}")
+                        return
+                    try:
+                        response = encode_response(STATUS_OK, server.transcribe(samples, phrases, is_instruction))
+                    except Exception as e:
+                        server._logger.error(f"Could not transcribe audio: {type(e)} {e}")
+                        response = encode_response(STATUS_ERROR, f"{type(e).__name__}: {e}")
+                    self.request.sendall(response)
+
+        return _RequestHandler
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve transcriptions to lurker nodes.")
+    parser.add_argument("--lurker-home", default=os.getcwd() + "/lurker", help="Lurker home containing the config.json to load models from.")
+    parser.add_argument("--address", default=None, help="Address to listen on as host:port or unix:path. Defaults to LURKER_TRANSCRIPTION_SERVER or 127.0.0.1:8765.")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="Maximum number of keyword windows transcribed in one batch.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = _parse_args()
+    lurker_config = load_lurker_config(os.path.abspath(args.lurker_home) + "/config.json")
+    log.init_global_config(lurker_config.LURKER_LOG_LEVEL, file_name=lurker_config.LURKER_LOG_FILE)
+    address = args.address or lurker_config.LURKER_TRANSCRIPTION_SERVER or "127.0.0.1:8765"
+    transcriber, instruction_transcriber = create_transcribers(lurker_config)
+    TranscriptionServer(
+        address,
+        transcriber=transcriber,
+        instruction_transcriber=instruction_transcriber,
+        max_batch_size=args.max_batch_size,
+        batch_window_seconds=lurker_config.LURKER_SPEECH_CONFIG.transcription_batch_window_seconds
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
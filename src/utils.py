@@ -1,6 +1,6 @@
 import re
 from re import Pattern, Match
-from typing import List, Union, Dict, Any, Optional
+from typing import List, Union, Dict, Any, Optional, Iterable, Sequence, Callable
 
 
 class KeyParagraphMapping:
@@ -9,17 +9,31 @@ class KeyParagraphMapping:
     def compile_regexes(keys: List[str]) -> List[Pattern]:
         patterns = []
         for key in keys:
-            if key.startswith("/") and key.endswith("/"):
+            if KeyParagraphMapping.is_regex_key(key):
                 pattern_string = key[1:-1]
             else:
                 pattern_string = ".*" + key + ".*"
             patterns.append(re.compile(pattern_string))
         return patterns
 
-    def __init__(self, keys: List[str], command: Union[str, int, None, Dict[str, Any]]):
+    @staticmethod
+    def compile_search_regexes(keys: List[str]) -> List[Pattern]:
+        return [re.compile(key[1:-1] if KeyParagraphMapping.is_regex_key(key) else key) for key in keys]
+
+    @staticmethod
+    def is_regex_key(key: str) -> bool:
+        return key.startswith("/") and key.endswith("/")
+
+    def __init__(self, keys: List[str], command: Union[str, int, None, Dict[str, Any]], handler: Optional[str] = None):
+        """
+        :param handler: The name of the action handler to pass the command to. If None, the default handler is used.
+        """
         self.keys = keys
         self.value = command
+        self.handler = handler
         self.patterns: List[Pattern] = self.compile_regexes(self.keys)
+        self.search_patterns: List[Pattern] = self.compile_search_regexes(self.keys)
+        self.literal_keys: List[str] = [key for key in self.keys if not KeyParagraphMapping.is_regex_key(key)]
 
     def matches(self, snippet: str) -> Optional[Match]:
         for p in self.patterns:
@@ -28,8 +42,83 @@ class KeyParagraphMapping:
                 return match
         return None
 
+    def remainder(self, snippet: str) -> str:
+        """
+        :return: The part of the snippet following the earliest and longest occurrence of any key or an empty string if
+        no key occurs.
+        """
+        earliest_match: Optional[Match] = None
+        for p in self.search_patterns:
+            match = p.search(snippet)
+            if match is not None and (earliest_match is None or (match.start(), -match.end()) < (earliest_match.start(), -earliest_match.end())):
+                earliest_match = match
+        return "" if earliest_match is None else snippet[earliest_match.end():]
+
     def __repr__(self):
         return str(self.keys)
 
     def __str__(self):
-        return f"{self.__class__.__name__}[keys: {self.keys}, command: {self.value}]"
+        return f"{self.__class__.__name__}[keys: {self.keys}, command: {self.value}, handler: {self.handler}]"
+
+
+class TokenTrieNode:
+
+    def __init__(self):
+        self.children: Dict[int, TokenTrieNode] = {}
+        self.is_terminal = False
+
+
+class TokenTrie:
+    """
+    Prefix tree over token sequences.
+    """
+
+    def __init__(self, sequences: Iterable[Sequence[int]]):
+        self.root = TokenTrieNode()
+        self.size = 0
+        for sequence in sequences:
+            self.add(sequence)
+
+    def add(self, sequence: Sequence[int]) -> None:
+        node = self.root
+        for token in sequence:
+            node = node.children.setdefault(token, TokenTrieNode())
+        if not node.is_terminal:
+            node.is_terminal = True
+            self.size += 1
+
+    def walk(self, tokens: Sequence[int]) -> Optional[TokenTrieNode]:
+        """
+        :return: The node reached by following the given tokens from the root or None if there is no such node.
+        """
+        node = self.root
+        for token in tokens:
+            node = node.children.get(token, None)
+            if node is None:
+                return None
+        return node
+
+    def sequences(self) -> Iterable[List[int]]:
+        """
+        :return: All sequences added to this trie.
+        """
+        pending = [(self.root, [])]
+        while len(pending) > 0:
+            node, sequence = pending.pop()
+            if node.is_terminal:
+                yield sequence
+            pending.extend((child, sequence + [token]) for token, child in node.children.items())
+
+    def active_nodes(self, tokens: Sequence[int]) -> List[TokenTrieNode]:
+        """
+        :return: The root and all nodes reached by a suffix of the given tokens, i.e. all sequences that may be
+        continued or started right after the given tokens.
+        """
+        nodes = [self.root]
+        for token in tokens:
+            nodes = [self.root] + [node.children[token] for node in nodes if token in node.children]
+        return nodes
+
+
+VocabularyProvider = Callable[[Callable[[str], Iterable[Sequence[int]]]], TokenTrie]
+"""Returns a token trie over a vocabulary given a function mapping a phrase to its token sequences."""
@@ -0,0 +1,89 @@
+import math
+from threading import Lock
+
+import numpy as np
+
+
+class SlidingAudioWindow:
+    """
+    Ring buffer over the most recently captured audio samples.
+
+    Samples are addressed by their absolute offset since the last reset. The buffer is partitioned into buckets of
+    equal size and the mean absolute amplitude of each bucket is computed exactly once when the bucket has been filled.
+    Overlapping windows evaluated on top of this buffer therefore share the work spent on their common buckets.
+    """
+
+    def __init__(self, capacity_samples: int, bucket_size: int, dtype: np.dtype = np.dtype(np.int16)):
+        if bucket_size < 1:
+            raise ValueError(f"Bucket size must be positive: {bucket_size}")
+        self.bucket_size = bucket_size
+        # the capacity is a multiple of the bucket size such that no bucket wraps around the end of the buffer
+        # and holds one additional bucket which is currently being filled
+        self.capacity = (math.ceil(capacity_samples / bucket_size) + 1) * bucket_size
+        self._samples = np.zeros(self.capacity, dtype=dtype)
+        self._bucket_means = np.zeros(self.capacity // bucket_size, dtype=np.float64)
+        self._sample_count = 0
+        self._lock = Lock()
+
+    @property
+    def sample_count(self) -> int:
+        """The absolute number of samples written since the last reset."""
+        return self._sample_count
+
+    @property
+    def bucket_count(self) -> int:
+        """The absolute number of completely filled buckets since the last reset."""
+        return self._sample_count // self.bucket_size
+
+    @property
+    def first_available_bucket(self) -> int:
+        """The absolute index of the oldest bucket still held by this buffer."""
+        return max(0, math.ceil(self._sample_count / self.bucket_size) - len(self._bucket_means))
+
+    def write(self, block: np.ndarray) -> None:
+        with self._lock:
+            if len(block) > self.capacity:
+                # older samples would be overwritten right away
+                self._sample_count += len(block) - self.capacity
+                block = block[-self.capacity:]
+            buckets_before = self.bucket_count
+            start = self._sample_count % self.capacity
+            head_length = min(len(block), self.capacity - start)
+            self._samples[start:start + head_length] = block[:head_length]
+            self._samples[:len(block) - head_length] = block[head_length:]
+            self._sample_count += len(block)
+
+            for bucket in range(max(buckets_before, self.first_available_bucket), self.bucket_count):
+                ring_bucket = bucket % len(self._bucket_means)
+                lower = ring_bucket * self.bucket_size
+                self._bucket_means[ring_bucket] = np.abs(self._samples[lower:lower + self.bucket_size]).mean()
+
+    def bucket_means(self, start_bucket: int, end_bucket: int) -> np.ndarray:
+        """
+        :param start_bucket: The absolute index of the first bucket (inclusive).
+        :param end_bucket: The absolute index of the last bucket (exclusive).
+        :return: A copy of the mean absolute amplitudes of the requested buckets.
+        """
+        with self._lock:
+            self._check_bucket_range(start_bucket, end_bucket)
+            indices = np.arange(start_bucket, end_bucket) % len(self._bucket_means)
+            return self._bucket_means[indices]
+
+    def samples(self, start_bucket: int, end_bucket: int) -> np.ndarray:
+        """
+        :param start_bucket: The absolute index of the first bucket (inclusive).
+        :param end_bucket: The absolute index of the last bucket (exclusive).
+        :return: A copy of the samples contained in the requested buckets.
+        """
+        with self._lock:
+            self._check_bucket_range(start_bucket, end_bucket)
+            indices = np.arange(start_bucket * self.bucket_size, end_bucket * self.bucket_size) % self.capacity
+            return self._samples[indices]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._sample_count = 0
+
+    def _check_bucket_range(self, start_bucket: int, end_bucket: int) -> None:
+        if start_bucket < self.first_available_bucket or end_bucket > self.bucket_count or start_bucket > end_bucket:
+            raise IndexError(f"Buckets [{start_bucket}, {end_bucket}) are not available: first_available_bucket={self.first_available_bucket}, bucket_count={self.bucket_count}")